@@ -1,7 +1,8 @@
 """Admin API endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import Competitor, ParseLog
 from app.tasks import parse_competitors
 from datetime import datetime
@@ -12,47 +13,53 @@ router = APIRouter()
 
 
 @router.post("/parse/petrov")
-async def parse_petrov(db: Session = Depends(get_db)):
+async def parse_petrov(db: AsyncSession = Depends(get_async_db)):
     """Trigger Petrov.ru parsing."""
     task = parse_competitors.delay("petrov")
     return {"task_id": task.id, "status": "queued"}
 
 
 @router.post("/parse/leroy")
-async def parse_leroy(db: Session = Depends(get_db)):
+async def parse_leroy(db: AsyncSession = Depends(get_async_db)):
     """Trigger Leroy Merlin parsing."""
     task = parse_competitors.delay("leroy_merlin")
     return {"task_id": task.id, "status": "queued"}
 
 
 @router.post("/parse/obi")
-async def parse_obi(db: Session = Depends(get_db)):
+async def parse_obi(db: AsyncSession = Depends(get_async_db)):
     """Trigger Obi parsing."""
     task = parse_competitors.delay("obi")
     return {"task_id": task.id, "status": "queued"}
 
 
 @router.get("/parse/status")
-async def parse_status(db: Session = Depends(get_db)):
+async def parse_status(db: AsyncSession = Depends(get_async_db)):
     """Get parsing status."""
     # Get latest parse logs for each competitor
-    petrov_log = db.query(ParseLog).filter(
-        ParseLog.competitor_id == db.query(Competitor).filter(
-            Competitor.competitor_type == "petrov"
-        ).with_entities(Competitor.id).scalar()
-    ).order_by(ParseLog.created_at.desc()).first()
+    petrov_log = await db.scalar(
+        select(ParseLog).filter(
+            ParseLog.competitor_id == select(Competitor.id).filter(
+                Competitor.competitor_type == "petrov"
+            ).scalar_subquery()
+        ).order_by(ParseLog.created_at.desc()).limit(1)
+    )
     
-    leroy_log = db.query(ParseLog).filter(
-        ParseLog.competitor_id == db.query(Competitor).filter(
-            Competitor.competitor_type == "leroy_merlin"
-        ).with_entities(Competitor.id).scalar()
-    ).order_by(ParseLog.created_at.desc()).first()
+    leroy_log = await db.scalar(
+        select(ParseLog).filter(
+            ParseLog.competitor_id == select(Competitor.id).filter(
+                Competitor.competitor_type == "leroy_merlin"
+            ).scalar_subquery()
+        ).order_by(ParseLog.created_at.desc()).limit(1)
+    )
     
-    obi_log = db.query(ParseLog).filter(
-        ParseLog.competitor_id == db.query(Competitor).filter(
-            Competitor.competitor_type == "obi"
-        ).with_entities(Competitor.id).scalar()
-    ).order_by(ParseLog.created_at.desc()).first()
+    obi_log = await db.scalar(
+        select(ParseLog).filter(
+            ParseLog.competitor_id == select(Competitor.id).filter(
+                Competitor.competitor_type == "obi"
+            ).scalar_subquery()
+        ).order_by(ParseLog.created_at.desc()).limit(1)
+    )
     
     return {
         "petrov": petrov_log.dict() if petrov_log else None,
@@ -1,8 +1,9 @@
 """Competitors API endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
+from app.database import get_async_db
 from app.models import Competitor
 from app import schemas
 import logging
@@ -12,16 +13,16 @@ router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.CompetitorRead])
-async def list_competitors(db: Session = Depends(get_db)):
+async def list_competitors(db: AsyncSession = Depends(get_async_db)):
     """List all competitors."""
-    competitors = db.query(Competitor).all()
+    competitors = (await db.scalars(select(Competitor))).all()
     return competitors
 
 
 @router.get("/{competitor_id}", response_model=schemas.CompetitorRead)
-async def get_competitor(competitor_id: int, db: Session = Depends(get_db)):
+async def get_competitor(competitor_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get competitor by ID."""
-    competitor = db.query(Competitor).filter(Competitor.id == competitor_id).first()
+    competitor = await db.get(Competitor, competitor_id)
     if not competitor:
         raise HTTPException(status_code=404, detail="Competitor not found")
     return competitor
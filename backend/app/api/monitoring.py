@@ -1,12 +1,17 @@
 """Price monitoring API endpoints."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
+from datetime import datetime, timedelta
+from app.database import get_async_db
 from app.models_extended import (
     PriceSource, MarketAnalysis, CompetitorPriceRanking, 
     PriceAlert, ProductSourceMapping
 )
+from app.price_monitor.rollup import SnapshotRollup
+from app.config import settings
+from app.utils.cache import cached, market_analysis_key, price_ranking_key
 from app import schemas
 import logging
 
@@ -15,87 +20,119 @@ router = APIRouter()
 
 
 @router.get("/price-sources/", tags=["Monitoring"])
-async def list_price_sources(db: Session = Depends(get_db)):
+async def list_price_sources(db: AsyncSession = Depends(get_async_db)):
     """List all price sources."""
-    sources = db.query(PriceSource).all()
+    sources = (await db.scalars(select(PriceSource))).all()
     return sources
 
 
 @router.get("/market-analysis/{product_id}", tags=["Monitoring"])
-async def get_market_analysis(product_id: int, db: Session = Depends(get_db)):
+async def get_market_analysis(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get market analysis for product."""
-    analysis = db.query(MarketAnalysis).filter(
-        MarketAnalysis.product_id == product_id
-    ).order_by(MarketAnalysis.analysis_date.desc()).first()
-    
-    if not analysis:
-        raise HTTPException(status_code=404, detail="No analysis found")
-    
-    return {
-        "product_id": product_id,
-        "analysis": analysis,
-        "market_data": {
-            "min_price": analysis.price_min,
-            "max_price": analysis.price_max,
-            "avg_price": analysis.price_avg,
-            "our_position": analysis.our_position,
-            "sellers_count": analysis.active_sellers_count,
-        },
-        "trends": {
-            "24h": analysis.price_trend_24h,
-            "7d": analysis.price_trend_7d,
-            "30d": analysis.price_trend_30d,
+    async def load():
+        analysis = await db.scalar(
+            select(MarketAnalysis).filter(
+                MarketAnalysis.product_id == product_id
+            ).order_by(MarketAnalysis.analysis_date.desc()).limit(1)
+        )
+        
+        # Raised inside the loader so misses are not cached
+        if not analysis:
+            raise HTTPException(status_code=404, detail="No analysis found")
+        
+        return {
+            "product_id": product_id,
+            "analysis": analysis,
+            "market_data": {
+                "min_price": analysis.price_min,
+                "max_price": analysis.price_max,
+                "avg_price": analysis.price_avg,
+                "our_position": analysis.our_position,
+                "sellers_count": analysis.active_sellers_count,
+            },
+            "trends": {
+                "24h": analysis.price_trend_24h,
+                "7d": analysis.price_trend_7d,
+                "30d": analysis.price_trend_30d,
+            }
         }
-    }
+    
+    return await cached(market_analysis_key(product_id), settings.cache_ttl_market_analysis, load)
 
 
 @router.get("/price-ranking/{product_id}", tags=["Monitoring"])
-async def get_price_ranking(product_id: int, db: Session = Depends(get_db)):
+async def get_price_ranking(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get price ranking for product."""
-    ranking = db.query(CompetitorPriceRanking).filter(
-        CompetitorPriceRanking.product_id == product_id
-    ).order_by(CompetitorPriceRanking.analysis_date.desc()).first()
+    async def load():
+        ranking = await db.scalar(
+            select(CompetitorPriceRanking).filter(
+                CompetitorPriceRanking.product_id == product_id
+            ).order_by(CompetitorPriceRanking.analysis_date.desc()).limit(1)
+        )
+        
+        if not ranking:
+            raise HTTPException(status_code=404, detail="No ranking found")
+        
+        return {
+            "product_id": product_id,
+            "our_rank": ranking.our_rank,
+            "total_competitors": ranking.total_competitors,
+            "recommended_price": ranking.recommended_price,
+            "recommendation_reason": ranking.recommendation_reason,
+            "price_comparison": {
+                "above_cheapest": ranking.price_above_cheapest,
+                "below_expensive": ranking.price_below_most_expensive,
+            }
+        }
     
-    if not ranking:
-        raise HTTPException(status_code=404, detail="No ranking found")
+    return await cached(price_ranking_key(product_id), settings.cache_ttl_price_ranking, load)
+
+
+@router.get("/price-history/{product_id}", tags=["Monitoring"])
+async def get_price_history(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    days: int = Query(7, ge=1, le=90),
+):
+    """Get hourly price history for product from the snapshot rollup."""
+    since = datetime.utcnow() - timedelta(days=days)
+    history = await db.run_sync(
+        lambda session: SnapshotRollup(session).history(product_id, since=since)
+    )
     
     return {
         "product_id": product_id,
-        "our_rank": ranking.our_rank,
-        "total_competitors": ranking.total_competitors,
-        "recommended_price": ranking.recommended_price,
-        "recommendation_reason": ranking.recommendation_reason,
-        "price_comparison": {
-            "above_cheapest": ranking.price_above_cheapest,
-            "below_expensive": ranking.price_below_most_expensive,
-        }
+        "days": days,
+        "points": history,
     }
 
 
 @router.get("/price-alerts/", tags=["Monitoring"])
 async def list_price_alerts(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     acknowledged: bool = False,
     limit: int = 50
 ):
     """List recent price alerts."""
-    query = db.query(PriceAlert).filter(PriceAlert.is_acknowledged == acknowledged)
-    alerts = query.order_by(PriceAlert.created_at.desc()).limit(limit).all()
+    alerts = (await db.scalars(
+        select(PriceAlert).filter(
+            PriceAlert.is_acknowledged == acknowledged
+        ).order_by(PriceAlert.created_at.desc()).limit(limit)
+    )).all()
     return alerts
 
 
 @router.post("/price-alerts/{alert_id}/acknowledge", tags=["Monitoring"])
-async def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
+async def acknowledge_alert(alert_id: int, db: AsyncSession = Depends(get_async_db)):
     """Acknowledge a price alert."""
-    alert = db.query(PriceAlert).filter(PriceAlert.id == alert_id).first()
+    alert = await db.get(PriceAlert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    from datetime import datetime
     alert.is_acknowledged = True
     alert.acknowledged_at = datetime.utcnow()
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    await db.refresh(alert)
     
     logger.info(f"Alert {alert_id} acknowledged")
     return alert
@@ -1,8 +1,16 @@
 """Prices API endpoints."""
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.database import get_async_db
 from app.models import Product, CompetitorPrice
+from app.price_monitor import competitor_history
+from app.config import settings
+from app import schemas
+from app.utils.cache import cached, price_compare_key
+from datetime import datetime
+from operator import attrgetter, itemgetter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,27 +18,94 @@ router = APIRouter()
 
 
 @router.get("/{product_id}")
-async def get_product_prices(product_id: int, db: Session = Depends(get_db)):
-    """Get price history for a product."""
-    prices = db.query(CompetitorPrice).filter(
-        CompetitorPrice.product_id == product_id
-    ).order_by(CompetitorPrice.created_at.desc()).all()
+async def get_product_prices(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    since: datetime = Query(None, alias="from"),
+    until: datetime = Query(None, alias="to"),
+    resolution: str = Query("raw", pattern="^(raw|hourly|daily)$"),
+    points: int = Query(None, ge=3, le=10000),
+):
+    """Get price history for a product, newest first.
+    
+    `from`/`to` bound the period. With `resolution` hourly or daily prices
+    are aggregated per competitor in the database. `points` caps each
+    competitor's series, downsampled with LTTB for charts.
+    """
+    if resolution == "raw":
+        prices = await db.run_sync(
+            lambda session: competitor_history.raw_prices(session, product_id, since, until)
+        )
+        time_of, price_of = attrgetter("created_at"), attrgetter("price")
+        competitor_of = attrgetter("competitor_id")
+    else:
+        prices = await db.run_sync(
+            lambda session: competitor_history.bucketed_prices(session, product_id, resolution, since, until)
+        )
+        time_of, price_of = itemgetter("period"), itemgetter("avg_price")
+        competitor_of = itemgetter("competitor_id")
+    
+    if points:
+        prices = competitor_history.downsample_per_competitor(prices, points, competitor_of, time_of, price_of)
+    
     return prices
 
 
 @router.get("/compare/{product_id}")
-async def compare_prices(product_id: int, db: Session = Depends(get_db)):
+async def compare_prices(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Compare prices with competitors."""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        return {"error": "Product not found"}
+    async def load():
+        product = await db.get(Product, product_id)
+        # Raised inside the loader so misses are not cached
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Competitors are loaded up front, lazy loading is not available on async sessions
+        competitor_prices = (await db.scalars(
+            select(CompetitorPrice).filter(
+                CompetitorPrice.product_id == product_id
+            ).options(selectinload(CompetitorPrice.competitor))
+        )).all()
+        
+        return _comparison(product, competitor_prices)
+    
+    return await cached(price_compare_key(product_id), settings.cache_ttl_price_compare, load)
+
+
+@router.post("/compare:batch")
+async def compare_prices_batch(
+    request: schemas.PriceCompareBatch,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Compare prices with competitors for several products at once.
     
-    competitor_prices = db.query(CompetitorPrice).filter(
-        CompetitorPrice.product_id == product_id
-    ).all()
+    Products, their competitor prices and the competitors are read in three
+    queries however many products are requested.
+    """
+    product_ids = list(dict.fromkeys(request.product_ids))
     
+    products = (await db.scalars(
+        select(Product).filter(
+            Product.id.in_(product_ids)
+        ).options(
+            selectinload(Product.competitor_prices).selectinload(CompetitorPrice.competitor)
+        )
+    )).all()
+    by_id = {product.id: product for product in products}
+    
+    return {
+        "comparisons": [
+            _comparison(by_id[product_id], by_id[product_id].competitor_prices)
+            for product_id in product_ids
+            if product_id in by_id
+        ],
+        "not_found": [product_id for product_id in product_ids if product_id not in by_id],
+    }
+
+
+def _comparison(product: Product, competitor_prices) -> dict:
     return {
-        "product_id": product_id,
+        "product_id": product.id,
         "product_name": product.name,
         "our_price": product.our_price,
         "competitor_prices": [
@@ -0,0 +1,72 @@
+"""Pricing API endpoints."""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models import PricingStrategy
+from app.pricing.strategy_cache import get_active_strategy, publish_strategy_changed
+from app.pricing.simulation import (
+    UNSIMULATED_FIELDS, get_catalog_snapshot, strategy_with_overrides, simulate_strategy
+)
+from app import schemas
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/strategy", response_model=schemas.PricingStrategyRead)
+async def get_strategy(db: AsyncSession = Depends(get_async_db)):
+    """Get active pricing strategy."""
+    strategy = await db.scalar(select(PricingStrategy).filter(PricingStrategy.is_active == True).limit(1))
+    if not strategy:
+        raise HTTPException(status_code=404, detail="No active pricing strategy")
+    return strategy
+
+
+@router.put("/strategy", response_model=schemas.PricingStrategyRead)
+async def update_strategy(
+    strategy: schemas.PricingStrategyUpdate,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Update active pricing strategy, creating it if there is none."""
+    db_strategy = await db.scalar(select(PricingStrategy).filter(PricingStrategy.is_active == True).limit(1))
+    if not db_strategy:
+        db_strategy = PricingStrategy(is_active=True)
+        db.add(db_strategy)
+    
+    update_data = strategy.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_strategy, field, value)
+    
+    await db.commit()
+    await db.refresh(db_strategy)
+    
+    # Cached copies in API and Celery workers are dropped on this message
+    await run_in_threadpool(publish_strategy_changed)
+    
+    logger.info(f"Pricing strategy updated: {update_data}")
+    return db_strategy
+
+
+@router.post("/simulate")
+async def simulate_pricing(
+    strategy: schemas.PricingStrategyUpdate,
+    refresh: bool = Query(False),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Preview alternative strategy parameters over the whole catalog without saving anything."""
+    overrides = strategy.dict(exclude_unset=True)
+    unsupported = [field for field in UNSIMULATED_FIELDS if field in overrides]
+    if unsupported:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Not used by the pricing rules, cannot be simulated: {', '.join(unsupported)}",
+        )
+    
+    simulated_strategy = strategy_with_overrides(await db.run_sync(get_active_strategy), overrides)
+    snapshot = await db.run_sync(lambda session: get_catalog_snapshot(session, refresh=refresh))
+    
+    # Array work runs off the event loop
+    return await run_in_threadpool(simulate_strategy, snapshot, simulated_strategy)
@@ -1,73 +1,210 @@
 """Products API endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional
+from app.database import get_async_db, AsyncSessionLocal
 from app.models import Product
+from app.config import settings
+from app.utils.cache import invalidate_products_async
+from app.utils.etag import weak_etag, etag_matches, not_modified
+from app.utils.product_import import (
+    ProductImporter, ImportFormatError, read_lines, read_csv, read_ndjson,
+    CSV_CONTENT_TYPES, NDJSON_CONTENT_TYPES
+)
 from app import schemas
+import base64
+import binascii
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_CHUNK_SIZE = 1000
+
+# Built once, creating a TypeAdapter compiles its validator and serializer
+PRODUCT_LIST_ADAPTER = TypeAdapter(List[schemas.ProductRead])
+PRODUCT_READ_COLUMNS = [Product.__table__.c[name] for name in schemas.ProductRead.model_fields]
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing after `last_id`."""
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Product id a cursor points after."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _filter_products(statement, category: Optional[str], is_active: Optional[bool]):
+    if category:
+        statement = statement.filter(Product.category == category)
+    
+    if is_active is not None:
+        statement = statement.filter(Product.is_active == is_active)
+    
+    return statement
+
 
 @router.get("/", response_model=List[schemas.ProductRead])
 async def list_products(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     category: str = Query(None),
     is_active: bool = Query(None),
+    cursor: str = Query(None),
 ):
-    """List all products with optional filters."""
-    query = db.query(Product)
+    """List all products with optional filters.
     
-    if category:
-        query = query.filter(Product.category == category)
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one
+    by id instead of `skip`, which stays fast however deep the page is.
     
-    if is_active is not None:
-        query = query.filter(Product.is_active == is_active)
+    The ETag covers the page's size, ids and latest updated_at, so a
+    matching If-None-Match gets a 304 without loading the products.
+    """
+    statement = _filter_products(select(Product), category, is_active).order_by(Product.id).limit(limit)
+    
+    if cursor:
+        statement = statement.filter(Product.id > decode_cursor(cursor))
+    else:
+        statement = statement.offset(skip)
+    
+    page = statement.with_only_columns(Product.id, Product.updated_at).subquery()
+    count, last_id, id_sum, last_updated = (await db.execute(
+        select(func.count(), func.max(page.c.id), func.sum(page.c.id), func.max(page.c.updated_at))
+    )).one()
+    
+    etag = weak_etag(count, id_sum, last_updated)
+    headers = {"ETag": etag}
+    if count == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last_id)
+    
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
     
-    products = query.offset(skip).limit(limit).all()
-    return products
+    if settings.api_fast_list_responses:
+        # Plain rows instead of ORM entities, encoded with orjson
+        rows = (await db.execute(statement.with_only_columns(*PRODUCT_READ_COLUMNS))).all()
+        products = PRODUCT_LIST_ADAPTER.validate_python([row._asdict() for row in rows])
+        return ORJSONResponse(PRODUCT_LIST_ADAPTER.dump_python(products), headers=headers)
+    
+    response.headers.update(headers)
+    return (await db.scalars(statement)).all()
+
+
+@router.get("/export")
+async def export_products(
+    category: str = Query(None),
+    is_active: bool = Query(None),
+):
+    """Stream the filtered catalog as NDJSON, one product per line."""
+    return StreamingResponse(
+        _export_lines(category, is_active),
+        media_type="application/x-ndjson",
+    )
+
+
+async def _export_lines(category: Optional[str], is_active: Optional[bool]) -> AsyncIterator[str]:
+    """Serialize products read from a server-side cursor in chunks."""
+    # Own session: the response outlives the request's dependencies
+    async with AsyncSessionLocal() as db:
+        statement = _filter_products(select(Product), category, is_active).order_by(
+            Product.id
+        ).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        
+        result = await db.stream_scalars(statement)
+        async for products in result.partitions():
+            yield "".join(
+                schemas.ProductRead.model_validate(product).model_dump_json() + "\n"
+                for product in products
+            )
+            db.expunge_all()
 
 
 @router.get("/{product_id}", response_model=schemas.ProductRead)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    """Get product by ID."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get product by ID, 304 when If-None-Match has its current ETag."""
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    
+    etag = weak_etag(product.id, product.updated_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    response.headers["ETag"] = etag
     return product
 
 
 @router.post("/", response_model=schemas.ProductRead)
 async def create_product(
     product: schemas.ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create new product."""
     # Check if SKU already exists
-    existing = db.query(Product).filter(Product.sku == product.sku).first()
+    existing = await db.scalar(select(Product).filter(Product.sku == product.sku))
     if existing:
         raise HTTPException(status_code=400, detail="Product with this SKU already exists")
     
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await db.refresh(db_product)
     logger.info(f"Product created: {db_product.sku}")
     return db_product
 
 
+@router.post("/bulk")
+async def import_products(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Create or update products by SKU from a streamed CSV or NDJSON body.
+    
+    Send `Content-Type: text/csv` with a header row or
+    `application/x-ndjson` with one product object per line; fields are
+    those of product creation. Valid rows are imported in one transaction,
+    invalid ones are reported by row number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type in CSV_CONTENT_TYPES:
+        rows = read_csv(read_lines(request.stream()))
+    elif content_type in NDJSON_CONTENT_TYPES:
+        rows = read_ndjson(read_lines(request.stream()))
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+    
+    try:
+        return await ProductImporter(db).run(rows)
+    except ImportFormatError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.put("/{product_id}", response_model=schemas.ProductRead)
 async def update_product(
     product_id: int,
     product: schemas.ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Update product."""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -75,20 +212,22 @@ async def update_product(
     for field, value in update_data.items():
         setattr(db_product, field, value)
     
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await invalidate_products_async([product_id])
+    await db.refresh(db_product)
     logger.info(f"Product updated: {db_product.sku}")
     return db_product
 
 
 @router.delete("/{product_id}")
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete product."""
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    await db.commit()
+    await invalidate_products_async([product_id])
     logger.info(f"Product deleted: {db_product.sku}")
     return {"status": "deleted"}
@@ -1,22 +1,118 @@
 """Database configuration and utilities."""
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import os
+import time
 import redis
-from typing import Generator
+import redis.asyncio
+from typing import Any, AsyncGenerator, Dict, Generator
 from app.config import settings
+from app.utils.metrics import DB_POOL_CHECKOUT_WAIT, pool_collector
+
+# Async drivers for the sync database URLs
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Same database as `url`, through its asyncio driver."""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits."""
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(pool=self.logging_name).observe(time.perf_counter() - started)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waits."""
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(pool=self.logging_name).observe(time.perf_counter() - started)
+
+
+def engine_options(profile: str) -> Dict[str, Any]:
+    """Pool settings for a process role (settings.db_engine_profile)."""
+    if profile == "api":
+        # Uvicorn workers: keep warm connections instead of connecting per request
+        pool_size = settings.db_pool_size
+        max_overflow = settings.db_max_overflow
+    elif profile == "worker":
+        # Celery workers: a small pool per process, reset after fork below
+        pool_size = settings.db_worker_pool_size
+        max_overflow = settings.db_worker_pool_size
+    else:
+        raise ValueError(f"Unknown database engine profile: {profile}")
+    
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
 
 # PostgreSQL
 engine = create_engine(
     settings.database_url,
     echo=settings.debug,
-    poolclass=NullPool,  # Avoid connection pool issues in Celery
+    poolclass=TimedQueuePool,
+    pool_logging_name="sync",
+    **engine_options(settings.db_engine_profile),
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the API. Its sessions use SessionLocal's class underneath,
+# so session event listeners registered on SessionLocal apply to both.
+async_engine = create_async_engine(
+    settings.async_database_url or async_database_url(settings.database_url),
+    echo=settings.debug,
+    poolclass=TimedAsyncQueuePool,
+    pool_logging_name="async",
+    **engine_options(settings.db_engine_profile),
+)
+
+pool_collector.register("sync", engine)
+pool_collector.register("async", async_engine.sync_engine)
+
+
+def _reset_pools_after_fork() -> None:
+    """Drop inherited connections in forked children (Celery prefork) without closing the parent's."""
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+    sync_session_class=SessionLocal.class_,
+)
+
 # Redis
 redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+async_redis_client = redis.asyncio.from_url(settings.redis_url, decode_responses=True)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -28,6 +124,12 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session (API routes)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 class Database:
     """Database helper class."""
     
@@ -1,11 +1,14 @@
 """FastAPI application factory."""
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from brotli_asgi import BrotliMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from contextlib import asynccontextmanager
 import logging
 from app.config import settings
-from app.database import Database
-from app.api import products, competitors, prices, admin
+from app.database import Database, async_engine
+from app.api import products, competitors, prices, admin, monitoring, pricing
+from app.price_monitor import change_tracker  # noqa: F401  (registers dirty-product listeners)
 
 # Setup logging
 logging.basicConfig(
@@ -24,6 +27,7 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await async_engine.dispose()
 
 
 def create_app() -> FastAPI:
@@ -41,6 +45,14 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", products.NEXT_CURSOR_HEADER],
+    )
+    
+    # Brotli, or gzip for clients that do not accept it
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=settings.api_compression_min_size,
+        gzip_fallback=True,
     )
     
     # Routes
@@ -48,6 +60,8 @@ def create_app() -> FastAPI:
     app.include_router(competitors.router, prefix="/api/competitors", tags=["Competitors"])
     app.include_router(prices.router, prefix="/api/prices", tags=["Prices"])
     app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+    app.include_router(monitoring.router, prefix="/api/monitoring")
+    app.include_router(pricing.router, prefix="/api/pricing", tags=["Pricing"])
     
     @app.get("/")
     async def root():
@@ -57,6 +71,12 @@ def create_app() -> FastAPI:
             "status": "running"
         }
     
+    # Prometheus scrape endpoint (database pool metrics), a route so /metrics
+    # answers directly instead of redirecting to /metrics/ as a mount would
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    
     @app.get("/health")
     async def health():
         return {"status": "healthy"}
@@ -1,6 +1,6 @@
 """Extended models for competitive price analysis."""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, JSON, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.models import Base
 
@@ -32,6 +32,29 @@ class PriceSnapshot(Base):
     price_source = relationship("PriceSource", foreign_keys=[price_source_id])
 
 
+class PriceSnapshotHourly(Base):
+    """Hourly rollup of price snapshots per product and source."""
+    __tablename__ = "price_snapshot_hourly"
+    __table_args__ = (
+        UniqueConstraint('product_id', 'price_source_id', 'hour', name='uq_snapshot_hourly'),
+        Index('idx_hourly_product_hour', 'product_id', 'hour'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    price_source_id = Column(Integer, ForeignKey("price_sources.id"), nullable=False)
+    hour = Column(DateTime, nullable=False)  # Snapshot date truncated to the hour
+    
+    snapshot_count = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    price_min = Column(Float, nullable=True)
+    price_max = Column(Float, nullable=True)
+    
+    # Latest snapshot within the hour
+    last_price = Column(Float, nullable=True)
+    last_snapshot_date = Column(DateTime, nullable=True)
+
+
 class PriceSource(Base):
     """Price source (marketplace, shop, etc)."""
     __tablename__ = "price_sources"
@@ -3,16 +3,18 @@ import logging
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from statistics import mean, median, stdev
+from statistics import mean
 import numpy as np
 
 from app.models import Product, CompetitorPrice
 from app.models_extended import (
-    PriceSnapshot, PriceSource, ProductSourceMapping, 
+    PriceSource, ProductSourceMapping, 
     MarketAnalysis, PriceAlert, CompetitorPriceRanking
 )
 from app.config import settings
+from app.price_monitor.rollup import SnapshotRollup, truncate_to_hour
+from app.price_monitor.write_buffer import MonitorWriteBuffer
+from app.price_monitor.context import MarketContext
 
 logger = logging.getLogger(__name__)
 
@@ -23,102 +25,181 @@ class PriceAggregator:
     def __init__(self, db: Session):
         self.db = db
     
-    def analyze_product_market(self, product_id: int) -> Optional[MarketAnalysis]:
+    def analyze_product_market(
+        self,
+        product_id: int,
+        buffer: Optional[MonitorWriteBuffer] = None,
+    ) -> Optional[MarketAnalysis]:
         """Analyze market for a specific product."""
+        results = self.analyze_products_market([product_id], buffer=buffer)
+        
+        if product_id not in results:
+            return None
+        
+        return MarketAnalysis(**results[product_id])
+    
+    def analyze_products_market(
+        self,
+        product_ids: List[int],
+        buffer: Optional[MonitorWriteBuffer] = None,
+        contexts: Optional[Dict[int, MarketContext]] = None,
+    ) -> Dict[int, Dict]:
+        """Analyze market for a batch of products in one vectorized pass.
+        
+        Results are written through `buffer`; without one they are upserted
+        and committed before returning. Pass preloaded `contexts` to skip
+        reading products and competitor prices again.
+        """
+        if buffer is None:
+            with MonitorWriteBuffer(self.db) as buffer:
+                return self.analyze_products_market(product_ids, buffer=buffer, contexts=contexts)
+        
+        results: Dict[int, Dict] = {}
+        if not product_ids:
+            return results
+        
         try:
-            product = self.db.query(Product).filter(Product.id == product_id).first()
-            if not product:
-                logger.error(f"Product not found: {product_id}")
-                return None
-            
-            # Get all competitor prices for this product
-            competitor_prices = self.db.query(CompetitorPrice).filter(
-                CompetitorPrice.product_id == product_id,
-                CompetitorPrice.in_stock == True,
-            ).all()
-            
-            if not competitor_prices:
-                logger.warning(f"No competitor prices found for {product.sku}")
-                return None
-            
-            prices = [cp.price for cp in competitor_prices if cp.price > 0]
-            
-            if not prices:
-                return None
+            # In-stock competitor prices for the whole batch, sorted so that
+            # every product occupies one contiguous run of ascending prices
+            if contexts is not None:
+                our_prices = {
+                    pid: contexts[pid].product.our_price for pid in product_ids if pid in contexts
+                }
+                rows = sorted(
+                    (pid, cp.price)
+                    for pid in our_prices
+                    for cp in contexts[pid].in_stock_prices
+                    if cp.price > 0
+                )
+            else:
+                our_prices = dict(
+                    self.db.query(Product.id, Product.our_price).filter(
+                        Product.id.in_(product_ids)
+                    ).all()
+                )
+                rows = self.db.query(CompetitorPrice.product_id, CompetitorPrice.price).filter(
+                    CompetitorPrice.product_id.in_(product_ids),
+                    CompetitorPrice.in_stock == True,
+                    CompetitorPrice.price > 0,
+                ).order_by(CompetitorPrice.product_id, CompetitorPrice.price).all()
+            
+            if not rows:
+                logger.warning(f"No competitor prices found for {len(product_ids)} products")
+                return results
+            
+            pids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            prices = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+            
+            group_ids, starts, counts = np.unique(pids, return_index=True, return_counts=True)
+            ends = starts + counts
             
             # Calculate statistics
-            price_min = min(prices)
-            price_max = max(prices)
-            price_avg = mean(prices)
-            price_median = median(prices)
-            price_std_dev = stdev(prices) if len(prices) > 1 else 0.0
-            
-            # Determine our market position
-            our_price = product.our_price
-            our_position = self._determine_position(our_price, prices)
-            our_percentile = (sum(1 for p in prices if p <= our_price) / len(prices)) * 100
-            
-            # Get Yandex Market price if available
-            yandex_price = self._get_yandex_market_price(product_id)
-            yandex_deviation = None
-            if yandex_price:
-                yandex_deviation = ((our_price - yandex_price) / yandex_price) * 100
-            
-            # Price trends
-            trends = self._calculate_price_trends(product_id)
-            
-            # Create or update analysis
-            analysis = self.db.query(MarketAnalysis).filter(
-                MarketAnalysis.product_id == product_id
-            ).first()
-            
-            if not analysis:
-                analysis = MarketAnalysis(product_id=product_id)
+            price_min = prices[starts]
+            price_max = prices[ends - 1]
+            price_avg = np.add.reduceat(prices, starts) / counts
+            price_median = (prices[starts + (counts - 1) // 2] + prices[starts + counts // 2]) / 2
             
-            analysis.active_sellers_count = len(prices)
-            analysis.price_min = price_min
-            analysis.price_max = price_max
-            analysis.price_avg = price_avg
-            analysis.price_median = price_median
-            analysis.price_std_dev = price_std_dev
-            analysis.our_position = our_position
-            analysis.our_price_percentile = our_percentile
-            analysis.yandex_market_price = yandex_price
-            analysis.yandex_market_deviation = yandex_deviation
-            analysis.price_trend = trends['trend']
-            analysis.price_trend_24h = trends['trend_24h']
-            analysis.price_trend_7d = trends['trend_7d']
-            analysis.price_trend_30d = trends['trend_30d']
-            analysis.analysis_date = datetime.utcnow()
+            squared_dev = (prices - np.repeat(price_avg, counts)) ** 2
+            sum_squared_dev = np.add.reduceat(squared_dev, starts)
+            price_std_dev = np.where(
+                counts > 1, np.sqrt(sum_squared_dev / np.maximum(counts - 1, 1)), 0.0
+            )
             
-            self.db.add(analysis)
-            self.db.commit()
-            self.db.refresh(analysis)
+            # Determine our market position
+            our = np.array(
+                [our_prices.get(int(pid), np.nan) for pid in group_ids], dtype=np.float64
+            )
+            at_or_below = (prices <= np.repeat(our, counts)).astype(np.int64)
+            our_percentile = np.add.reduceat(at_or_below, starts) / counts * 100
+            our_position = np.select(
+                [
+                    our <= price_min,
+                    our >= price_max,
+                    our <= price_avg * 0.95,
+                    our >= price_avg * 1.05,
+                ],
+                ["cheapest", "most_expensive", "below_median", "above_median"],
+                default="median",
+            )
+            
+            trends_by_product = self._calculate_price_trends_bulk(group_ids.tolist())
             
-            logger.info(f"Market analysis completed for {product.sku}")
-            return analysis
+            now = datetime.utcnow()
+            for i, pid in enumerate(group_ids.tolist()):
+                if pid not in our_prices:
+                    continue
+                
+                our_price = our_prices[pid]
+                yandex_price = self._get_yandex_market_price(pid)
+                yandex_deviation = None
+                if yandex_price:
+                    yandex_deviation = ((our_price - yandex_price) / yandex_price) * 100
+                
+                trends = trends_by_product[pid]
+                
+                results[pid] = {
+                    'product_id': pid,
+                    'active_sellers_count': int(counts[i]),
+                    'price_min': float(price_min[i]),
+                    'price_max': float(price_max[i]),
+                    'price_avg': float(price_avg[i]),
+                    'price_median': float(price_median[i]),
+                    'price_std_dev': float(price_std_dev[i]),
+                    'our_position': str(our_position[i]),
+                    'our_price_percentile': float(our_percentile[i]),
+                    'yandex_market_price': yandex_price,
+                    'yandex_market_deviation': yandex_deviation,
+                    'price_trend': trends['trend'],
+                    'price_trend_24h': trends['trend_24h'],
+                    'price_trend_7d': trends['trend_7d'],
+                    'price_trend_30d': trends['trend_30d'],
+                    'analysis_date': now,
+                }
+            
+            for row in results.values():
+                buffer.add_analysis(row)
+            
+            logger.info(f"Market analysis completed for {len(results)}/{len(product_ids)} products")
+            return results
         
         except Exception as e:
-            logger.error(f"Error analyzing market for product {product_id}: {str(e)}")
-            return None
+            self.db.rollback()
+            logger.error(f"Error analyzing market for {len(product_ids)} products: {str(e)}")
+            return {}
     
-    def create_price_ranking(self, product_id: int) -> Optional[CompetitorPriceRanking]:
+    def create_price_ranking(
+        self,
+        product_id: int,
+        buffer: Optional[MonitorWriteBuffer] = None,
+        context: Optional[MarketContext] = None,
+    ) -> Optional[CompetitorPriceRanking]:
         """Create price ranking compared to competitors."""
+        if buffer is None:
+            with MonitorWriteBuffer(self.db) as buffer:
+                return self.create_price_ranking(product_id, buffer=buffer, context=context)
+        
         try:
-            product = self.db.query(Product).filter(Product.id == product_id).first()
-            if not product:
-                return None
-            
-            # Get competitor prices
-            competitor_prices = self.db.query(CompetitorPrice).filter(
-                CompetitorPrice.product_id == product_id,
-                CompetitorPrice.in_stock == True,
-            ).all()
+            if context is not None:
+                product = context.product
+                competitor_prices = context.in_stock_prices
+            else:
+                product = self.db.query(Product).filter(Product.id == product_id).first()
+                if not product:
+                    return None
+                
+                # Get competitor prices
+                competitor_prices = self.db.query(CompetitorPrice).filter(
+                    CompetitorPrice.product_id == product_id,
+                    CompetitorPrice.in_stock == True,
+                ).all()
             
             if not competitor_prices:
                 return None
             
             prices = sorted([cp.price for cp in competitor_prices if cp.price > 0])
+            if not prices:
+                return None
+            
             our_price = product.our_price
             
             # Find our rank
@@ -140,28 +221,21 @@ class PriceAggregator:
             recommended_price = self._calculate_optimal_price(prices, product)
             reason = self._get_recommendation_reason(our_price, prices, recommended_price)
             
-            # Create or update ranking
-            ranking = self.db.query(CompetitorPriceRanking).filter(
-                CompetitorPriceRanking.product_id == product_id
-            ).first()
+            values = {
+                'product_id': product_id,
+                'total_competitors': len(prices),
+                'our_rank': our_rank,
+                'price_above_cheapest': price_above_cheapest,
+                'price_below_most_expensive': price_below_expensive,
+                'recommended_price': recommended_price,
+                'recommendation_reason': reason,
+                'analysis_date': datetime.utcnow(),
+            }
             
-            if not ranking:
-                ranking = CompetitorPriceRanking(product_id=product_id)
-            
-            ranking.total_competitors = len(prices)
-            ranking.our_rank = our_rank
-            ranking.price_above_cheapest = price_above_cheapest
-            ranking.price_below_most_expensive = price_below_expensive
-            ranking.recommended_price = recommended_price
-            ranking.recommendation_reason = reason
-            ranking.analysis_date = datetime.utcnow()
-            
-            self.db.add(ranking)
-            self.db.commit()
-            self.db.refresh(ranking)
+            buffer.add_ranking(values)
             
             logger.info(f"Price ranking created for {product.sku}: rank {our_rank}/{len(prices)}")
-            return ranking
+            return CompetitorPriceRanking(**values)
         
         except Exception as e:
             logger.error(f"Error creating price ranking for {product_id}: {str(e)}")
@@ -228,60 +302,77 @@ class PriceAggregator:
     
     def _calculate_price_trends(self, product_id: int) -> Dict[str, Optional[float]]:
         """Calculate price trends over different periods."""
-        trends = {
+        return self._calculate_price_trends_bulk([product_id])[product_id]
+    
+    def _calculate_price_trends_bulk(self, product_ids: List[int]) -> Dict[int, Dict[str, Optional[float]]]:
+        """Calculate price trends for a batch of products in one grouped query."""
+        trends = {product_id: self._empty_trends() for product_id in product_ids}
+        if not product_ids:
+            return trends
+        
+        try:
+            current_hour = truncate_to_hour(datetime.utcnow())
+            
+            # Two hourly buckets each: the previous and the current hour, which
+            # cover the last 60 minutes, and the same two hours 24h, 7d and 30d ago
+            windows = {}
+            for key, delta in (
+                ('current', timedelta(0)),
+                ('old_24h', timedelta(hours=24)),
+                ('old_7d', timedelta(days=7)),
+                ('old_30d', timedelta(days=30)),
+            ):
+                window_start = current_hour - delta - timedelta(hours=1)
+                windows[key] = (window_start, window_start + timedelta(hours=2))
+            
+            averages = SnapshotRollup(self.db).window_averages(product_ids, windows)
+            
+            for product_id, avg in averages.items():
+                trends[product_id] = self._trends_from_averages(
+                    avg['current'], avg['old_24h'], avg['old_7d'], avg['old_30d']
+                )
+        
+        except Exception as e:
+            logger.error(f"Error calculating trends for {len(product_ids)} products: {str(e)}")
+        
+        return trends
+    
+    @staticmethod
+    def _empty_trends() -> Dict[str, Optional[float]]:
+        """Trends for a product without enough snapshot history."""
+        return {
             'trend': 'stable',
             'trend_24h': None,
             'trend_7d': None,
             'trend_30d': None,
         }
+    
+    def _trends_from_averages(
+        self,
+        current: Optional[float],
+        old_24h: Optional[float],
+        old_7d: Optional[float],
+        old_30d: Optional[float],
+    ) -> Dict[str, Optional[float]]:
+        """Turn hourly-window price averages into % trends."""
+        trends = self._empty_trends()
         
-        try:
-            now = datetime.utcnow()
-            
-            # Get snapshots for different periods
-            snapshot_24h_ago = now - timedelta(hours=24)
-            snapshot_7d_ago = now - timedelta(days=7)
-            snapshot_30d_ago = now - timedelta(days=30)
-            
-            current = self.db.query(func.avg(PriceSnapshot.price)).filter(
-                PriceSnapshot.product_id == product_id,
-                PriceSnapshot.snapshot_date >= now - timedelta(hours=1)
-            ).scalar()
-            
-            if current:
-                # 24h trend
-                old_24h = self.db.query(func.avg(PriceSnapshot.price)).filter(
-                    PriceSnapshot.product_id == product_id,
-                    PriceSnapshot.snapshot_date.between(snapshot_24h_ago, snapshot_24h_ago + timedelta(hours=1))
-                ).scalar()
-                if old_24h:
-                    trends['trend_24h'] = ((current - old_24h) / old_24h) * 100
-                
-                # 7d trend
-                old_7d = self.db.query(func.avg(PriceSnapshot.price)).filter(
-                    PriceSnapshot.product_id == product_id,
-                    PriceSnapshot.snapshot_date.between(snapshot_7d_ago, snapshot_7d_ago + timedelta(hours=1))
-                ).scalar()
-                if old_7d:
-                    trends['trend_7d'] = ((current - old_7d) / old_7d) * 100
-                
-                # 30d trend
-                old_30d = self.db.query(func.avg(PriceSnapshot.price)).filter(
-                    PriceSnapshot.product_id == product_id,
-                    PriceSnapshot.snapshot_date.between(snapshot_30d_ago, snapshot_30d_ago + timedelta(hours=1))
-                ).scalar()
-                if old_30d:
-                    trends['trend_30d'] = ((current - old_30d) / old_30d) * 100
-                
-                # Determine trend direction
-                if trends['trend_7d']:
-                    if trends['trend_7d'] > 5:
-                        trends['trend'] = 'up'
-                    elif trends['trend_7d'] < -5:
-                        trends['trend'] = 'down'
+        if not current:
+            return trends
         
-        except Exception as e:
-            logger.error(f"Error calculating trends for {product_id}: {str(e)}")
+        if old_24h:
+            trends['trend_24h'] = ((current - old_24h) / old_24h) * 100
+        if old_7d:
+            trends['trend_7d'] = ((current - old_7d) / old_7d) * 100
+        if old_30d:
+            trends['trend_30d'] = ((current - old_30d) / old_30d) * 100
+        
+        # Determine trend direction
+        if trends['trend_7d']:
+            if trends['trend_7d'] > 5:
+                trends['trend'] = 'up'
+            elif trends['trend_7d'] < -5:
+                trends['trend'] = 'down'
         
         return trends
     
@@ -0,0 +1,161 @@
+"""Track which products have changed monitoring inputs since the last run."""
+import asyncio
+import logging
+from typing import Iterable, List, Set
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, redis_client
+from app.models import Product, CompetitorPrice, SalesStats
+from app.models_extended import PriceSnapshot
+from app.pricing.reprice_queue import request_reprice
+from app.utils.cache import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+DIRTY_PRODUCTS_KEY = "monitor:dirty_products"
+
+# Products to re-read on the next incremental feature store build
+FEATURE_DIRTY_PRODUCTS_KEY = "features:dirty_products"
+
+# Product columns that feed market analysis, repricing and the feature store;
+# is_active decides whether a product is included at all
+TRACKED_PRODUCT_FIELDS = ("cost", "our_price", "is_active")
+
+# Product columns whose changes trigger an immediate reprice
+REPRICE_PRODUCT_FIELDS = ("cost",)
+
+
+def mark_products_dirty(product_ids: Iterable[int], key: str = DIRTY_PRODUCTS_KEY) -> None:
+    """Add products to a dirty set."""
+    ids = [int(product_id) for product_id in product_ids]
+    if not ids:
+        return
+    
+    try:
+        redis_client.sadd(key, *ids)
+    except Exception as e:
+        logger.error(f"Error marking {len(ids)} products dirty: {str(e)}")
+
+
+def mark_dirty_on_commit(session: Session, product_ids: Iterable[int], features: bool = False) -> None:
+    """Add products to the dirty set when `session` commits, for writes the listeners cannot see.
+    
+    With `features` they are also queued for the next feature store build.
+    """
+    product_ids = {int(product_id) for product_id in product_ids}
+    session.info.setdefault("dirty_products", set()).update(product_ids)
+    if features:
+        session.info.setdefault("feature_products", set()).update(product_ids)
+
+
+def pop_dirty_products(count: int, key: str = DIRTY_PRODUCTS_KEY) -> List[int]:
+    """Atomically take up to `count` products from a dirty set."""
+    members = redis_client.spop(key, count) or []
+    return [int(member) for member in members]
+
+
+def dirty_products_count(key: str = DIRTY_PRODUCTS_KEY) -> int:
+    """Number of products waiting in a dirty set (incremental monitoring by default)."""
+    return redis_client.scard(key)
+
+
+def _changed_product_ids(session: Session) -> Set[int]:
+    """Collect product ids touched by the pending flush."""
+    product_ids = set()
+    
+    for obj in session.new:
+        if isinstance(obj, (CompetitorPrice, PriceSnapshot)):
+            product_ids.add(obj.product_id)
+        elif isinstance(obj, Product):
+            product_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, CompetitorPrice):
+            product_ids.add(obj.product_id)
+        elif isinstance(obj, Product):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in TRACKED_PRODUCT_FIELDS):
+                product_ids.add(obj.id)
+    
+    for obj in session.deleted:
+        if isinstance(obj, CompetitorPrice):
+            product_ids.add(obj.product_id)
+    
+    product_ids.discard(None)
+    return product_ids
+
+
+def _reprice_product_ids(session: Session) -> Set[int]:
+    """Collect products whose cost or competitor prices change in the pending flush."""
+    product_ids = set()
+    
+    for obj in session.new:
+        if isinstance(obj, CompetitorPrice):
+            product_ids.add(obj.product_id)
+        elif isinstance(obj, Product):
+            product_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, CompetitorPrice):
+            state = inspect(obj)
+            if state.attrs.price.history.has_changes() or state.attrs.in_stock.history.has_changes():
+                product_ids.add(obj.product_id)
+        elif isinstance(obj, Product):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in REPRICE_PRODUCT_FIELDS):
+                product_ids.add(obj.id)
+    
+    product_ids.discard(None)
+    return product_ids
+
+
+def _sales_product_ids(session: Session) -> Set[int]:
+    """Collect products whose sales stats change in the pending flush."""
+    product_ids = {
+        obj.product_id
+        for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, SalesStats)
+    }
+    product_ids.discard(None)
+    return product_ids
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_dirty_products(session: Session, flush_context) -> None:
+    changed = _changed_product_ids(session)
+    session.info.setdefault("dirty_products", set()).update(changed)
+    session.info.setdefault("feature_products", set()).update(changed | _sales_product_ids(session))
+    session.info.setdefault("reprice_products", set()).update(_reprice_product_ids(session))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_dirty_products(session: Session) -> None:
+    dirty_products = session.info.pop("dirty_products", set())
+    feature_products = session.info.pop("feature_products", set())
+    reprice_products = session.info.pop("reprice_products", set())
+    if not (dirty_products or feature_products or reprice_products):
+        return
+    
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _publish_changes(dirty_products, feature_products, reprice_products)
+        return
+    
+    # AsyncSession commits run on the event loop, keep the Redis and broker round trips off it
+    loop.run_in_executor(None, _publish_changes, dirty_products, feature_products, reprice_products)
+
+
+def _publish_changes(dirty_products: Set[int], feature_products: Set[int], reprice_products: Set[int]) -> None:
+    invalidate_products(dirty_products)
+    mark_products_dirty(dirty_products)
+    mark_products_dirty(feature_products, FEATURE_DIRTY_PRODUCTS_KEY)
+    request_reprice(reprice_products)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_dirty_products(session: Session) -> None:
+    session.info.pop("dirty_products", None)
+    session.info.pop("feature_products", None)
+    session.info.pop("reprice_products", None)
@@ -0,0 +1,107 @@
+"""Competitor price series for product charts."""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import CompetitorPrice
+from app.utils.downsample import lttb_indices
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("raw", "hourly", "daily")
+
+# Resolution -> date_trunc() unit on PostgreSQL, strftime() format elsewhere
+TRUNCATE_UNITS = {"hourly": "hour", "daily": "day"}
+STRFTIME_FORMATS = {"hourly": "%Y-%m-%d %H:00:00", "daily": "%Y-%m-%d 00:00:00"}
+
+Point = TypeVar("Point")
+
+
+def raw_prices(
+    db: Session,
+    product_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[CompetitorPrice]:
+    """Stored competitor prices of a product, newest first."""
+    query = _filter_range(db.query(CompetitorPrice), product_id, since, until)
+    return query.order_by(CompetitorPrice.created_at.desc()).all()
+
+
+def bucketed_prices(
+    db: Session,
+    product_id: int,
+    resolution: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict]:
+    """Competitor prices aggregated per competitor and hour or day, newest first."""
+    if db.get_bind().dialect.name == "postgresql":
+        period = func.date_trunc(TRUNCATE_UNITS[resolution], CompetitorPrice.created_at)
+    else:
+        period = func.strftime(STRFTIME_FORMATS[resolution], CompetitorPrice.created_at)
+    
+    query = _filter_range(
+        db.query(
+            CompetitorPrice.competitor_id,
+            period.label("period"),
+            func.avg(CompetitorPrice.price).label("avg_price"),
+            func.min(CompetitorPrice.price).label("min_price"),
+            func.max(CompetitorPrice.price).label("max_price"),
+            func.count(CompetitorPrice.id).label("sample_count"),
+        ),
+        product_id, since, until,
+    ).group_by(
+        CompetitorPrice.competitor_id, period
+    ).order_by(
+        period.desc(), CompetitorPrice.competitor_id
+    )
+    
+    return [
+        {
+            "competitor_id": row.competitor_id,
+            # strftime() gives text, date_trunc() a timestamp
+            "period": datetime.fromisoformat(row.period) if isinstance(row.period, str) else row.period,
+            "avg_price": row.avg_price,
+            "min_price": row.min_price,
+            "max_price": row.max_price,
+            "sample_count": row.sample_count,
+        }
+        for row in query.all()
+    ]
+
+
+def downsample_per_competitor(
+    points: Sequence[Point],
+    budget: int,
+    competitor_of: Callable[[Point], int],
+    time_of: Callable[[Point], datetime],
+    price_of: Callable[[Point], float],
+) -> List[Point]:
+    """Reduce each competitor's series to at most `budget` points with LTTB, newest first."""
+    series = defaultdict(list)
+    for point in points:
+        series[competitor_of(point)].append(point)
+    
+    kept = []
+    for competitor_points in series.values():
+        competitor_points.sort(key=time_of)
+        x = np.array([time_of(point).timestamp() for point in competitor_points])
+        y = np.array([price_of(point) for point in competitor_points], dtype=np.float64)
+        kept.extend(competitor_points[i] for i in lttb_indices(x, y, budget))
+    
+    kept.sort(key=time_of, reverse=True)
+    return kept
+
+
+def _filter_range(query, product_id: int, since: Optional[datetime], until: Optional[datetime]):
+    query = query.filter(CompetitorPrice.product_id == product_id)
+    if since:
+        query = query.filter(CompetitorPrice.created_at >= since)
+    if until:
+        query = query.filter(CompetitorPrice.created_at < until)
+    return query
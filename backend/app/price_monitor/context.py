@@ -0,0 +1,79 @@
+"""Per-run market context shared by analysis, alerting and pricing."""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Product, CompetitorPrice, PricingStrategy
+from app.models_extended import PriceSnapshot
+from app.pricing.strategy_cache import get_active_strategy
+
+logger = logging.getLogger(__name__)
+
+# Latest and previous snapshot per (product, source) for change detection
+SNAPSHOTS_PER_SOURCE = 2
+
+
+@dataclass
+class MarketContext:
+    """Product row plus the market data loaded for it once per run."""
+    product: Product
+    competitor_prices: List[CompetitorPrice] = field(default_factory=list)
+    snapshots: List[PriceSnapshot] = field(default_factory=list)  # Per source, newest first
+    strategy: Optional[PricingStrategy] = None
+    
+    @property
+    def product_id(self) -> int:
+        return self.product.id
+    
+    @property
+    def in_stock_prices(self) -> List[CompetitorPrice]:
+        """Competitor prices for items currently in stock."""
+        return [cp for cp in self.competitor_prices if cp.in_stock]
+
+
+def load_market_contexts(
+    db: Session,
+    product_ids: List[int],
+    strategy: Optional[PricingStrategy] = None,
+) -> Dict[int, MarketContext]:
+    """Load market contexts for a batch of products with one query per table."""
+    if not product_ids:
+        return {}
+    
+    if strategy is None:
+        strategy = get_active_strategy(db)
+    
+    contexts = {
+        product.id: MarketContext(product=product, strategy=strategy)
+        for product in db.query(Product).filter(Product.id.in_(product_ids)).all()
+    }
+    
+    competitor_prices = db.query(CompetitorPrice).filter(
+        CompetitorPrice.product_id.in_(product_ids)
+    ).all()
+    for cp in competitor_prices:
+        contexts[cp.product_id].competitor_prices.append(cp)
+    
+    # Latest and previous snapshot per (product, source), ranked with a window function
+    rank = func.row_number().over(
+        partition_by=(PriceSnapshot.product_id, PriceSnapshot.price_source_id),
+        order_by=PriceSnapshot.snapshot_date.desc(),
+    ).label("rank")
+    recent = db.query(PriceSnapshot.id, rank).filter(
+        PriceSnapshot.product_id.in_(product_ids)
+    ).subquery()
+    snapshots = db.query(PriceSnapshot).join(
+        recent, PriceSnapshot.id == recent.c.id
+    ).filter(
+        recent.c.rank <= SNAPSHOTS_PER_SOURCE
+    ).order_by(
+        PriceSnapshot.product_id,
+        PriceSnapshot.price_source_id,
+        PriceSnapshot.snapshot_date.desc(),
+    ).all()
+    for snapshot in snapshots:
+        contexts[snapshot.product_id].snapshots.append(snapshot)
+    
+    return contexts
@@ -1,16 +1,23 @@
 """Real-time price monitoring service."""
 import logging
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
+from sqlalchemy import func
+from redis.exceptions import LockError
+import numpy as np
 
-from app.models import Product, CompetitorPrice, PricingStrategy
-from app.models_extended import (
-    PriceSnapshot, PriceSource, ProductSourceMapping,
-    MarketAnalysis, PriceAlert
-)
+from app.models import Product, PricingStrategy
+from app.models_extended import PriceSource, MarketAnalysis, PriceAlert
 from app.config import settings
 from app.price_monitor.aggregator import PriceAggregator
+from app.price_monitor.snapshot_writer import SnapshotWriter
+from app.price_monitor.source_lock import source_check_lock
+from app.price_monitor.write_buffer import MonitorWriteBuffer
+from app.price_monitor.context import MarketContext, load_market_contexts
+from app.price_monitor.change_tracker import (
+    mark_products_dirty, pop_dirty_products, dirty_products_count
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,41 +31,21 @@ class PriceMonitor:
     
     def monitor_all_products(self) -> Dict[str, int]:
         """Monitor prices for all active products."""
-        stats = {
-            'total_products': 0,
-            'products_analyzed': 0,
-            'prices_updated': 0,
-            'alerts_created': 0,
-        }
+        stats = self._empty_stats()
         
         try:
             # Get all active products
-            products = self.db.query(Product).filter(
+            products = self.db.query(Product.id, Product.sku).filter(
                 Product.is_active == True
-            ).all()
+            ).order_by(Product.id).all()
             
             stats['total_products'] = len(products)
             logger.info(f"Starting price monitoring for {len(products)} products")
             
-            for product in products:
-                try:
-                    # Analyze market
-                    analysis = self.aggregator.analyze_product_market(product.id)
-                    if analysis:
-                        stats['products_analyzed'] += 1
-                    
-                    # Check for price changes and create alerts
-                    alerts = self._check_price_changes(product.id)
-                    stats['alerts_created'] += len(alerts)
-                    
-                    # Update pricing based on market analysis
-                    updated = self._update_product_price(product.id)
-                    if updated:
-                        stats['prices_updated'] += 1
-                
-                except Exception as e:
-                    logger.error(f"Error monitoring product {product.sku}: {str(e)}")
-                    continue
+            batch_size = settings.monitor_batch_size
+            with MonitorWriteBuffer(self.db) as buffer:
+                for offset in range(0, len(products), batch_size):
+                    self._monitor_batch(products[offset:offset + batch_size], stats, buffer)
             
             logger.info(f"Price monitoring completed: {stats}")
             return stats
@@ -67,8 +54,128 @@ class PriceMonitor:
             logger.error(f"Error in price monitoring: {str(e)}")
             return stats
     
+    def monitor_products(self, product_ids: List[int]) -> Dict[str, int]:
+        """Monitor prices for a given set of active products (one shard)."""
+        stats = self._empty_stats()
+        
+        try:
+            products = self.db.query(Product.id, Product.sku).filter(
+                Product.id.in_(product_ids),
+                Product.is_active == True
+            ).order_by(Product.id).all()
+            
+            stats['total_products'] = len(products)
+            
+            batch_size = settings.monitor_batch_size
+            with MonitorWriteBuffer(self.db) as buffer:
+                for offset in range(0, len(products), batch_size):
+                    self._monitor_batch(products[offset:offset + batch_size], stats, buffer)
+            
+            return stats
+        
+        except Exception as e:
+            logger.error(f"Error monitoring {len(product_ids)} products: {str(e)}")
+            return stats
+    
+    def monitor_changed_products(self) -> Dict[str, int]:
+        """Monitor only products whose competitor prices, cost or snapshots changed."""
+        stats = self._empty_stats()
+        
+        try:
+            # Bound the run to what was dirty when it started, so products
+            # re-marked by concurrent writes wait for the next run
+            pending = dirty_products_count()
+            logger.info(f"Starting incremental price monitoring for {pending} changed products")
+            
+            with MonitorWriteBuffer(self.db) as buffer:
+                while pending > 0:
+                    product_ids = pop_dirty_products(min(settings.monitor_batch_size, pending))
+                    if not product_ids:
+                        break
+                    pending -= len(product_ids)
+                    
+                    try:
+                        products = self.db.query(Product.id, Product.sku).filter(
+                            Product.id.in_(product_ids),
+                            Product.is_active == True
+                        ).order_by(Product.id).all()
+                        
+                        stats['total_products'] += len(products)
+                        self._monitor_batch(products, stats, buffer)
+                    
+                    except Exception:
+                        # Put the batch back so the next run picks it up
+                        mark_products_dirty(product_ids)
+                        raise
+            
+            logger.info(f"Incremental price monitoring completed: {stats}")
+            return stats
+        
+        except Exception as e:
+            logger.error(f"Error in incremental price monitoring: {str(e)}")
+            return stats
+    
+    def _monitor_batch(self, products: List, stats: Dict[str, int], buffer: MonitorWriteBuffer) -> None:
+        """Analyze, alert and reprice one batch of (id, sku) product rows."""
+        product_ids = [p.id for p in products]
+        contexts = load_market_contexts(self.db, product_ids)
+        
+        # Analyze market for the whole batch at once
+        analyses = self.aggregator.analyze_products_market(product_ids, buffer=buffer, contexts=contexts)
+        stats['products_analyzed'] += len(analyses)
+        
+        # Check for price changes and create alerts
+        alerts = self._check_price_changes_bulk(contexts, buffer=buffer)
+        stats['alerts_created'] += sum(len(product_alerts) for product_alerts in alerts.values())
+        
+        for product in products:
+            context = contexts.get(product.id)
+            if context is None:
+                continue
+            
+            try:
+                # Update pricing based on market analysis
+                updated = self._update_product_price(
+                    product.id, buffer=buffer, analysis=analyses.get(product.id), context=context
+                )
+                if updated:
+                    stats['prices_updated'] += 1
+            
+            except Exception as e:
+                logger.error(f"Error monitoring product {product.sku}: {str(e)}")
+                continue
+    
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {
+            'total_products': 0,
+            'products_analyzed': 0,
+            'prices_updated': 0,
+            'alerts_created': 0,
+        }
+    
     def monitor_price_source(self, source_id: int) -> bool:
-        """Monitor prices from specific source."""
+        """Monitor prices from specific source, unless a check of it is already running.
+        
+        The source's check lock is held for the whole check and renewed after
+        every chunk of snapshots, so a slow check is never started twice.
+        """
+        lock = source_check_lock(source_id)
+        if not lock.acquire(blocking=False):
+            logger.info(f"Price source {source_id} is already being checked")
+            return False
+        
+        try:
+            return self._check_price_source(source_id, heartbeat=lock.reacquire)
+        
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                logger.warning(f"Check lock of price source {source_id} expired before the check finished")
+    
+    def _check_price_source(self, source_id: int, heartbeat: Callable[[], None]) -> bool:
+        """Snapshot one source and record the outcome on it."""
         try:
             source = self.db.query(PriceSource).filter(
                 PriceSource.id == source_id,
@@ -86,33 +193,8 @@ class PriceMonitor:
             source.last_checked = datetime.utcnow()
             self.db.commit()
             
-            # Get all mapped products for this source
-            mappings = self.db.query(ProductSourceMapping).filter(
-                ProductSourceMapping.price_source_id == source_id,
-                ProductSourceMapping.is_active == True
-            ).all()
-            
-            logger.info(f"Found {len(mappings)} product mappings for {source.name}")
-            
-            updated_count = 0
-            for mapping in mappings:
-                try:
-                    # Update price snapshot
-                    if mapping.last_price:
-                        snapshot = PriceSnapshot(
-                            product_id=mapping.product_id,
-                            price_source_id=source_id,
-                            price=mapping.last_price,
-                            snapshot_date=datetime.utcnow()
-                        )
-                        self.db.add(snapshot)
-                        updated_count += 1
-                
-                except Exception as e:
-                    logger.error(f"Error updating snapshot for mapping {mapping.id}: {str(e)}")
-                    continue
-            
-            self.db.commit()
+            # Stream mapped products of this source into snapshots
+            updated_count = SnapshotWriter(self.db).write_source(source, heartbeat=heartbeat)
             source.check_status = "success"
             source.last_error = None
             self.db.commit()
@@ -122,6 +204,7 @@ class PriceMonitor:
         
         except Exception as e:
             logger.error(f"Error monitoring source {source_id}: {str(e)}")
+            self.db.rollback()
             source = self.db.query(PriceSource).filter(PriceSource.id == source_id).first()
             if source:
                 source.check_status = "error"
@@ -129,80 +212,128 @@ class PriceMonitor:
                 self.db.commit()
             return False
     
-    def _check_price_changes(self, product_id: int) -> List[PriceAlert]:
+    def _check_price_changes(
+        self,
+        product_id: int,
+        buffer: Optional[MonitorWriteBuffer] = None,
+        context: Optional[MarketContext] = None,
+    ) -> List[PriceAlert]:
         """Check for significant price changes."""
-        alerts = []
+        contexts = {product_id: context} if context else load_market_contexts(self.db, [product_id])
+        return self._check_price_changes_bulk(contexts, buffer=buffer).get(product_id, [])
+    
+    def _check_price_changes_bulk(
+        self,
+        contexts: Dict[int, MarketContext],
+        buffer: Optional[MonitorWriteBuffer] = None,
+    ) -> Dict[int, List[PriceAlert]]:
+        """Compare latest vs previous snapshot price for every (product, source) pair."""
+        if buffer is None:
+            with MonitorWriteBuffer(self.db) as buffer:
+                return self._check_price_changes_bulk(contexts, buffer=buffer)
+        
+        alerts: Dict[int, List[PriceAlert]] = {}
         
         try:
-            product = self.db.query(Product).filter(Product.id == product_id).first()
-            if not product:
+            # Context snapshots are ordered by source, newest first, two per source
+            pairs = []
+            for context in contexts.values():
+                snapshots = context.snapshots
+                for latest, previous in zip(snapshots, snapshots[1:]):
+                    if latest.price_source_id == previous.price_source_id:
+                        pairs.append((context.product_id, latest, previous))
+            
+            if not pairs:
                 return alerts
             
-            # Get current competitor prices
-            current_prices = self.db.query(CompetitorPrice).filter(
-                CompetitorPrice.product_id == product_id
-            ).all()
-            
-            # Get last known prices
-            last_snapshot_date = datetime.utcnow()
-            last_snapshots = self.db.query(PriceSnapshot).filter(
-                PriceSnapshot.product_id == product_id,
-                PriceSnapshot.snapshot_date < last_snapshot_date
-            ).order_by(PriceSnapshot.snapshot_date.desc()).limit(10).all()
-            
-            for current in current_prices:
-                # Find corresponding last snapshot
-                last = next(
-                    (s for s in last_snapshots if s.price_source_id == current.competitor_id),
-                    None
-                )
-                
-                if last:
-                    # Check for significant change
-                    change_percent = ((current.price - last.price) / last.price) * 100
-                    
-                    # Alert on >10% change
-                    if abs(change_percent) > 10:
-                        alert_type = "price_drop" if change_percent < 0 else "price_spike"
-                        
-                        alert = PriceAlert(
-                            product_id=product_id,
-                            price_source_id=current.competitor_id,
-                            alert_type=alert_type,
-                            old_price=last.price,
-                            new_price=current.price,
-                            change_percent=change_percent,
-                            message=f"Price {'decreased' if change_percent < 0 else 'increased'} "
-                                   f"by {abs(change_percent):.1f}% from {last.price} to {current.price}"
-                        )
-                        self.db.add(alert)
-                        alerts.append(alert)
-                        logger.warning(f"Price alert for {product.sku}: {alert.message}")
+            latest_prices = np.array([latest.price for _, latest, _ in pairs], dtype=np.float64)
+            previous_prices = np.array([previous.price for _, _, previous in pairs], dtype=np.float64)
             
-            self.db.commit()
+            # Check for significant change
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change_percent = (latest_prices - previous_prices) / previous_prices * 100
+            significant = (previous_prices > 0) & (np.abs(change_percent) > settings.price_alert_threshold_percent)
+            
+            if not significant.any():
+                return alerts
+            
+            # Skip pairs already alerted on since their latest snapshot
+            last_alerted = {
+                (row.product_id, row.price_source_id): row.last_alert
+                for row in self.db.query(
+                    PriceAlert.product_id,
+                    PriceAlert.price_source_id,
+                    func.max(PriceAlert.created_at).label("last_alert"),
+                ).filter(
+                    PriceAlert.product_id.in_(list(contexts))
+                ).group_by(PriceAlert.product_id, PriceAlert.price_source_id).all()
+            }
+            
+            for i in np.flatnonzero(significant):
+                product_id, latest, previous = pairs[i]
+                alerted_at = last_alerted.get((product_id, latest.price_source_id))
+                if alerted_at and alerted_at >= latest.snapshot_date:
+                    continue
+                
+                change = float(change_percent[i])
+                alert_type = "price_drop" if change < 0 else "price_spike"
+                
+                values = {
+                    'product_id': product_id,
+                    'price_source_id': latest.price_source_id,
+                    'alert_type': alert_type,
+                    'old_price': previous.price,
+                    'new_price': latest.price,
+                    'change_percent': change,
+                    'message': f"Price {'decreased' if change < 0 else 'increased'} "
+                               f"by {abs(change):.1f}% from {previous.price} to {latest.price}",
+                }
+                buffer.add_alert(values)
+                alerts.setdefault(product_id, []).append(PriceAlert(**values))
+                logger.warning(f"Price alert for {contexts[product_id].product.sku}: {values['message']}")
         
         except Exception as e:
-            logger.error(f"Error checking price changes for {product_id}: {str(e)}")
+            logger.error(f"Error checking price changes for {len(contexts)} products: {str(e)}")
         
         return alerts
     
-    def _update_product_price(self, product_id: int) -> bool:
-        """Update product price based on market analysis."""
+    def _update_product_price(
+        self,
+        product_id: int,
+        buffer: Optional[MonitorWriteBuffer] = None,
+        analysis: Optional[Dict] = None,
+        context: Optional[MarketContext] = None,
+    ) -> bool:
+        """Update product price based on market analysis.
+        
+        With a `context`, the caller passes the analysis it just produced
+        (it may still be buffered), and nothing is re-read from the database.
+        """
+        if buffer is None:
+            with MonitorWriteBuffer(self.db) as buffer:
+                return self._update_product_price(
+                    product_id, buffer=buffer, analysis=analysis, context=context
+                )
+        
         try:
-            product = self.db.query(Product).filter(Product.id == product_id).first()
-            if not product:
-                return False
-            
-            # Get market analysis
-            analysis = self.db.query(MarketAnalysis).filter(
-                MarketAnalysis.product_id == product_id
-            ).order_by(MarketAnalysis.analysis_date.desc()).first()
+            if context is not None:
+                product = context.product
+            else:
+                product = self.db.query(Product).filter(Product.id == product_id).first()
+                if not product:
+                    return False
+                
+                # Get market analysis
+                if analysis is None:
+                    analysis = self.db.query(MarketAnalysis).filter(
+                        MarketAnalysis.product_id == product_id
+                    ).order_by(MarketAnalysis.analysis_date.desc()).first()
             
             if not analysis:
                 return False
             
             # Create ranking
-            ranking = self.aggregator.create_price_ranking(product_id)
+            ranking = self.aggregator.create_price_ranking(product_id, buffer=buffer, context=context)
             if not ranking or not ranking.recommended_price:
                 return False
             
@@ -219,8 +350,9 @@ class PriceMonitor:
                     f"Updating price for {product.sku}: "
                     f"{current_price} -> {recommended_price} (reason: {ranking.recommendation_reason})"
                 )
-                product.our_price = recommended_price
-                self.db.commit()
+                buffer.add_price_change(
+                    product_id, recommended_price, current_price, reason="competitor_match"
+                )
                 return True
             
             return False
@@ -0,0 +1,262 @@
+"""Hourly rollup of price snapshots."""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert, aggregate_order_by, ARRAY
+from sqlalchemy.types import Float
+
+from app.models_extended import PriceSnapshot, PriceSnapshotHourly
+
+logger = logging.getLogger(__name__)
+
+# (product_id, price_source_id, price, snapshot_date)
+SnapshotRow = Tuple[int, int, float, datetime]
+
+UPSERT_CHUNK_SIZE = 1000
+
+
+def truncate_to_hour(value: datetime) -> datetime:
+    """Truncate datetime to the start of its hour."""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class SnapshotRollup:
+    """Maintain and query the price_snapshot_hourly rollup."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    @property
+    def _is_postgresql(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+    
+    def record(self, snapshots: Iterable[SnapshotRow]) -> int:
+        """Fold newly written snapshots into the rollup (caller commits)."""
+        buckets: Dict[Tuple[int, int, datetime], Dict] = {}
+        
+        for product_id, price_source_id, price, snapshot_date in snapshots:
+            key = (product_id, price_source_id, truncate_to_hour(snapshot_date))
+            bucket = buckets.get(key)
+            
+            if bucket is None:
+                buckets[key] = {
+                    'product_id': product_id,
+                    'price_source_id': price_source_id,
+                    'hour': key[2],
+                    'snapshot_count': 1,
+                    'price_sum': price,
+                    'price_min': price,
+                    'price_max': price,
+                    'last_price': price,
+                    'last_snapshot_date': snapshot_date,
+                }
+                continue
+            
+            bucket['snapshot_count'] += 1
+            bucket['price_sum'] += price
+            bucket['price_min'] = min(bucket['price_min'], price)
+            bucket['price_max'] = max(bucket['price_max'], price)
+            if snapshot_date >= bucket['last_snapshot_date']:
+                bucket['last_price'] = price
+                bucket['last_snapshot_date'] = snapshot_date
+        
+        rows = list(buckets.values())
+        for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[offset:offset + UPSERT_CHUNK_SIZE]
+            if self._is_postgresql:
+                self._upsert_postgresql(chunk)
+            else:
+                self._upsert_generic(chunk)
+        
+        return len(rows)
+    
+    def rebuild(self, product_ids: Optional[List[int]] = None) -> int:
+        """Rebuild the rollup from raw price_snapshots."""
+        delete_query = self.db.query(PriceSnapshotHourly)
+        if product_ids is not None:
+            delete_query = delete_query.filter(PriceSnapshotHourly.product_id.in_(product_ids))
+        delete_query.delete(synchronize_session=False)
+        
+        if self._is_postgresql:
+            self._rebuild_postgresql(product_ids)
+        else:
+            query = self.db.query(
+                PriceSnapshot.product_id,
+                PriceSnapshot.price_source_id,
+                PriceSnapshot.price,
+                PriceSnapshot.snapshot_date,
+            )
+            if product_ids is not None:
+                query = query.filter(PriceSnapshot.product_id.in_(product_ids))
+            
+            chunk: List[SnapshotRow] = []
+            for row in query.yield_per(UPSERT_CHUNK_SIZE * 10):
+                chunk.append(tuple(row))
+                if len(chunk) >= UPSERT_CHUNK_SIZE * 10:
+                    self.record(chunk)
+                    chunk = []
+            self.record(chunk)
+        
+        count_query = self.db.query(func.count(PriceSnapshotHourly.id))
+        if product_ids is not None:
+            count_query = count_query.filter(PriceSnapshotHourly.product_id.in_(product_ids))
+        return count_query.scalar()
+    
+    def window_averages(
+        self,
+        product_ids: List[int],
+        windows: Dict[str, Tuple[datetime, datetime]],
+    ) -> Dict[int, Dict[str, Optional[float]]]:
+        """Average price per product over hour windows.
+        
+        Each window covers the buckets from the hour of its start up to, but
+        not including, the hour of its end, and always at least the start
+        hour. A one-hour window therefore reads exactly one bucket and
+        adjacent windows never share one.
+        """
+        conditions = {}
+        for key, (start, end) in windows.items():
+            start_hour = truncate_to_hour(start)
+            end_hour = max(truncate_to_hour(end), start_hour + timedelta(hours=1))
+            conditions[key] = and_(
+                PriceSnapshotHourly.hour >= start_hour,
+                PriceSnapshotHourly.hour < end_hour,
+            )
+        
+        rows = self.db.query(
+            PriceSnapshotHourly.product_id,
+            *[
+                (
+                    func.sum(case((condition, PriceSnapshotHourly.price_sum)))
+                    / func.sum(case((condition, PriceSnapshotHourly.snapshot_count)))
+                ).label(key)
+                for key, condition in conditions.items()
+            ],
+        ).filter(
+            PriceSnapshotHourly.product_id.in_(product_ids),
+            or_(*conditions.values()),
+        ).group_by(PriceSnapshotHourly.product_id).all()
+        
+        return {
+            row.product_id: {key: getattr(row, key) for key in windows}
+            for row in rows
+        }
+    
+    def history(
+        self,
+        product_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Dict]:
+        """Hourly price series for a product, one point per source and hour."""
+        query = self.db.query(PriceSnapshotHourly).filter(
+            PriceSnapshotHourly.product_id == product_id
+        )
+        if since:
+            query = query.filter(PriceSnapshotHourly.hour >= truncate_to_hour(since))
+        if until:
+            query = query.filter(PriceSnapshotHourly.hour <= until)
+        
+        rows = query.order_by(PriceSnapshotHourly.hour, PriceSnapshotHourly.price_source_id).all()
+        
+        return [
+            {
+                'hour': row.hour,
+                'price_source_id': row.price_source_id,
+                'avg_price': row.price_sum / row.snapshot_count if row.snapshot_count else None,
+                'min_price': row.price_min,
+                'max_price': row.price_max,
+                'last_price': row.last_price,
+                'snapshot_count': row.snapshot_count,
+            }
+            for row in rows
+        ]
+    
+    def _upsert_postgresql(self, rows: List[Dict]) -> None:
+        """Merge buckets with INSERT ... ON CONFLICT DO UPDATE."""
+        table = PriceSnapshotHourly.__table__
+        stmt = pg_insert(table).values(rows)
+        excluded = stmt.excluded
+        
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_snapshot_hourly',
+            set_={
+                'snapshot_count': table.c.snapshot_count + excluded.snapshot_count,
+                'price_sum': table.c.price_sum + excluded.price_sum,
+                'price_min': func.least(table.c.price_min, excluded.price_min),
+                'price_max': func.greatest(table.c.price_max, excluded.price_max),
+                'last_price': case(
+                    (
+                        excluded.last_snapshot_date >= func.coalesce(
+                            table.c.last_snapshot_date, excluded.last_snapshot_date
+                        ),
+                        excluded.last_price,
+                    ),
+                    else_=table.c.last_price,
+                ),
+                'last_snapshot_date': func.greatest(table.c.last_snapshot_date, excluded.last_snapshot_date),
+            },
+        )
+        self.db.execute(stmt)
+    
+    def _upsert_generic(self, rows: List[Dict]) -> None:
+        """Merge buckets with read-modify-write for backends without ON CONFLICT."""
+        existing = {
+            (row.product_id, row.price_source_id, row.hour): row
+            for row in self.db.query(PriceSnapshotHourly).filter(
+                PriceSnapshotHourly.product_id.in_({r['product_id'] for r in rows}),
+                PriceSnapshotHourly.hour.in_({r['hour'] for r in rows}),
+            ).all()
+        }
+        
+        for r in rows:
+            current = existing.get((r['product_id'], r['price_source_id'], r['hour']))
+            if current is None:
+                self.db.add(PriceSnapshotHourly(**r))
+                continue
+            
+            current.snapshot_count += r['snapshot_count']
+            current.price_sum += r['price_sum']
+            current.price_min = min(current.price_min, r['price_min'])
+            current.price_max = max(current.price_max, r['price_max'])
+            if current.last_snapshot_date is None or r['last_snapshot_date'] >= current.last_snapshot_date:
+                current.last_price = r['last_price']
+                current.last_snapshot_date = r['last_snapshot_date']
+        
+        self.db.flush()
+    
+    def _rebuild_postgresql(self, product_ids: Optional[List[int]]) -> None:
+        """Rebuild rollup rows with a single INSERT ... SELECT."""
+        hour = func.date_trunc('hour', PriceSnapshot.snapshot_date)
+        last_price = func.array_agg(
+            aggregate_order_by(PriceSnapshot.price, PriceSnapshot.snapshot_date.desc()),
+            type_=ARRAY(Float),
+        )[1]
+        
+        select_query = self.db.query(
+            PriceSnapshot.product_id,
+            PriceSnapshot.price_source_id,
+            hour,
+            func.count(PriceSnapshot.id),
+            func.sum(PriceSnapshot.price),
+            func.min(PriceSnapshot.price),
+            func.max(PriceSnapshot.price),
+            last_price,
+            func.max(PriceSnapshot.snapshot_date),
+        ).group_by(PriceSnapshot.product_id, PriceSnapshot.price_source_id, hour)
+        
+        if product_ids is not None:
+            select_query = select_query.filter(PriceSnapshot.product_id.in_(product_ids))
+        
+        table = PriceSnapshotHourly.__table__
+        self.db.execute(
+            table.insert().from_select(
+                [
+                    'product_id', 'price_source_id', 'hour', 'snapshot_count', 'price_sum',
+                    'price_min', 'price_max', 'last_price', 'last_snapshot_date',
+                ],
+                select_query.statement,
+            )
+        )
@@ -0,0 +1,108 @@
+"""Streaming writer for price snapshots."""
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+
+from app.models_extended import PriceSnapshot, PriceSource, ProductSourceMapping
+from app.config import settings
+from app.price_monitor.rollup import SnapshotRollup
+from app.price_monitor.change_tracker import mark_dirty_on_commit
+
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = ("product_id", "price_source_id", "price", "currency", "in_stock", "snapshot_date")
+
+
+class SnapshotWriter:
+    """Write one snapshot per active mapping of a source in constant memory.
+    
+    Mappings are read in chunks from a server-side cursor. Each chunk is
+    written with COPY on PostgreSQL or executemany elsewhere, then folded
+    into the hourly rollup. Nothing is kept between chunks.
+    """
+    
+    def __init__(self, db: Session, chunk_size: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.snapshot_write_chunk_size
+    
+    def write_source(self, source: PriceSource, heartbeat: Optional[Callable[[], None]] = None) -> int:
+        """Snapshot all active mappings of a source (caller commits).
+        
+        `heartbeat` is called after each chunk, to show the check is still alive.
+        """
+        snapshot_date = datetime.utcnow()
+        rollup = SnapshotRollup(self.db)
+        use_copy = self.db.get_bind().dialect.name == "postgresql"
+        
+        result = self.db.execute(
+            select(ProductSourceMapping.product_id, ProductSourceMapping.last_price).filter(
+                ProductSourceMapping.price_source_id == source.id,
+                ProductSourceMapping.is_active == True
+            ).execution_options(yield_per=self.chunk_size)
+        )
+        
+        tracked_count = 0
+        written_count = 0
+        for mappings in result.partitions():
+            tracked_count += len(mappings)
+            
+            rows = [
+                (product_id, source.id, price, snapshot_date)
+                for product_id, price in mappings
+                if price
+            ]
+            if not rows:
+                continue
+            
+            if use_copy:
+                self._copy_rows(rows)
+            else:
+                self._insert_rows(rows)
+            
+            # Keep the hourly rollup in step with raw snapshots
+            rollup.record(rows)
+            mark_dirty_on_commit(self.db, (row[0] for row in rows))
+            written_count += len(rows)
+            
+            if heartbeat:
+                heartbeat()
+        
+        source.total_products_tracked = tracked_count
+        source.price_updates_count = (source.price_updates_count or 0) + written_count
+        
+        return written_count
+    
+    def _copy_rows(self, rows: List[Tuple]) -> None:
+        """Write rows with COPY FROM STDIN on the session's connection."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for product_id, price_source_id, price, snapshot_date in rows:
+            writer.writerow((product_id, price_source_id, price, "RUB", "t", snapshot_date.isoformat()))
+        buffer.seek(0)
+        
+        dbapi_connection = self.db.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {PriceSnapshot.__tablename__} ({', '.join(COPY_COLUMNS)}) "
+                f"FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+    
+    def _insert_rows(self, rows: List[Tuple]) -> None:
+        """Write rows with a batched executemany INSERT."""
+        self.db.execute(
+            insert(PriceSnapshot),
+            [
+                {
+                    'product_id': product_id,
+                    'price_source_id': price_source_id,
+                    'price': price,
+                    'snapshot_date': snapshot_date,
+                }
+                for product_id, price_source_id, price, snapshot_date in rows
+            ],
+        )
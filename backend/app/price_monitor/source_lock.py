@@ -0,0 +1,28 @@
+"""Redis lock held while a price source is being checked."""
+import logging
+from typing import Iterable, Set
+from redis.lock import Lock
+from app.config import settings
+from app.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+SOURCE_CHECK_LOCK_KEY = "monitor:source_check:{source_id}"
+
+
+def source_check_lock(source_id: int) -> Lock:
+    """Lock of one source's check; the checker renews it as it makes progress."""
+    return redis_client.lock(
+        SOURCE_CHECK_LOCK_KEY.format(source_id=source_id),
+        timeout=settings.source_check_lock_seconds,
+    )
+
+
+def running_source_checks(source_ids: Iterable[int]) -> Set[int]:
+    """Sources whose check lock is currently held."""
+    ids = list(source_ids)
+    if not ids:
+        return set()
+    
+    held = redis_client.mget([SOURCE_CHECK_LOCK_KEY.format(source_id=source_id) for source_id in ids])
+    return {source_id for source_id, token in zip(ids, held) if token is not None}
@@ -0,0 +1,156 @@
+"""Write-behind buffer for monitoring results."""
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models_extended import MarketAnalysis, PriceAlert, CompetitorPriceRanking
+from app.config import settings
+from app.pricing.writeback import PriceChange, write_price_changes
+from app.utils.cache import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+# Rows per multi-VALUES statement, keeps bind parameters under PostgreSQL's limit
+UPSERT_CHUNK_SIZE = 1000
+
+
+class MonitorWriteBuffer:
+    """Collect analysis, ranking, alert and price writes and flush them in batches.
+    
+    MarketAnalysis and CompetitorPriceRanking are unique per product, so they
+    are written with INSERT ... ON CONFLICT (product_id) DO UPDATE. Every
+    flush is a single commit. Use as a context manager to flush whatever is
+    left when the run ends, including when it ends with an error.
+    """
+    
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.monitor_write_batch_size
+        self._analyses: Dict[int, Dict] = {}
+        self._rankings: Dict[int, Dict] = {}
+        self._alerts: List[Dict] = []
+        self._price_changes: Dict[int, PriceChange] = {}
+    
+    def __enter__(self) -> "MonitorWriteBuffer":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing monitoring writes: {str(e)}")
+            if exc_type is None:
+                raise
+    
+    @property
+    def pending(self) -> int:
+        """Number of buffered rows."""
+        return len(self._analyses) + len(self._rankings) + len(self._alerts) + len(self._price_changes)
+    
+    def add_analysis(self, values: Dict) -> None:
+        self._analyses[values['product_id']] = values
+        self._maybe_flush()
+    
+    def add_ranking(self, values: Dict) -> None:
+        self._rankings[values['product_id']] = values
+        self._maybe_flush()
+    
+    def add_alert(self, values: Dict) -> None:
+        self._alerts.append(values)
+        self._maybe_flush()
+    
+    def add_price_change(
+        self,
+        product_id: int,
+        new_price: float,
+        old_price: float,
+        reason: Optional[str] = None,
+    ) -> None:
+        self._price_changes[product_id] = PriceChange(product_id, old_price, new_price, reason)
+        self._maybe_flush()
+    
+    def flush(self) -> None:
+        """Write all buffered rows and commit once."""
+        if not self.pending:
+            return
+        
+        analyses = list(self._analyses.values())
+        rankings = list(self._rankings.values())
+        alerts = self._alerts
+        price_changes = self._price_changes
+        
+        self._analyses = {}
+        self._rankings = {}
+        self._alerts = []
+        self._price_changes = {}
+        
+        try:
+            self._upsert_by_product(MarketAnalysis, analyses)
+            self._upsert_by_product(CompetitorPriceRanking, rankings)
+            
+            if alerts:
+                self.db.execute(insert(PriceAlert), alerts)
+            
+            # Prices go through the shared write-back so they get PriceHistory rows
+            write_price_changes(self.db, price_changes.values())
+            
+            self.db.commit()
+        
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        # Upserts bypass the session listeners, drop the cached responses here
+        invalidate_products([row['product_id'] for row in analyses + rankings])
+        
+        logger.debug(
+            f"Flushed {len(analyses)} analyses, {len(rankings)} rankings, "
+            f"{len(alerts)} alerts, {len(price_changes)} price changes"
+        )
+    
+    def _maybe_flush(self) -> None:
+        if self.pending >= self.batch_size:
+            self.flush()
+    
+    def _upsert_by_product(self, model, rows: List[Dict]) -> None:
+        """INSERT ... ON CONFLICT (product_id) DO UPDATE in chunks."""
+        if not rows:
+            return
+        
+        insert_fn = UPSERT_INSERTS.get(self.db.get_bind().dialect.name)
+        if insert_fn is None:
+            self._upsert_by_product_generic(model, rows)
+            return
+        
+        for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[offset:offset + UPSERT_CHUNK_SIZE]
+            stmt = insert_fn(model.__table__).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['product_id'],
+                set_={key: stmt.excluded[key] for key in chunk[0] if key != 'product_id'},
+            )
+            self.db.execute(stmt)
+    
+    def _upsert_by_product_generic(self, model, rows: List[Dict]) -> None:
+        """Select existing ids, then bulk update and bulk insert."""
+        existing = dict(
+            self.db.query(model.product_id, model.id).filter(
+                model.product_id.in_([row['product_id'] for row in rows])
+            ).all()
+        )
+        
+        updates = [dict(row, id=existing[row['product_id']]) for row in rows if row['product_id'] in existing]
+        inserts = [row for row in rows if row['product_id'] not in existing]
+        
+        if updates:
+            self.db.bulk_update_mappings(model, updates)
+        if inserts:
+            self.db.bulk_insert_mappings(model, inserts)
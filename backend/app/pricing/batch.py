@@ -0,0 +1,198 @@
+"""Vectorized catalog-wide pricing."""
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models import Product, CompetitorPrice, PricingStrategy
+from app.pricing.strategy_cache import get_active_strategy
+from app.pricing.feature_store import popularity_scores
+from app.pricing.writeback import PriceChange, price_change_mask, write_price_changes
+
+logger = logging.getLogger(__name__)
+
+# Price change at popularity_weight 1.0 for the best and worst sellers
+POPULARITY_MAX_ADJUSTMENT = 0.10
+
+
+@dataclass
+class PricingInputs:
+    """Per-product pricing inputs as parallel arrays, sorted by product id."""
+    product_ids: np.ndarray
+    costs: np.ndarray
+    our_prices: np.ndarray
+    competitor_count: np.ndarray
+    competitor_avg: np.ndarray  # NaN where there are no in-stock competitor prices
+    competitor_min: np.ndarray
+    competitor_max: np.ndarray
+    stored_stats: np.ndarray  # Current (min_price, max_price, avg_competitor_price), NaN for NULL
+    category_codes: np.ndarray  # Index into category_names
+    category_names: List[str]
+    
+    def __len__(self) -> int:
+        return len(self.product_ids)
+    
+    @property
+    def has_competitors(self) -> np.ndarray:
+        return self.competitor_count > 0
+
+
+def load_pricing_inputs(db: Session, product_ids: Optional[List[int]] = None) -> PricingInputs:
+    """Load costs and in-stock competitor price aggregates for active products."""
+    product_query = db.query(
+        Product.id, Product.cost, Product.our_price,
+        Product.min_price, Product.max_price, Product.avg_competitor_price,
+        Product.category,
+    ).filter(
+        Product.is_active == True
+    )
+    price_query = db.query(CompetitorPrice.product_id, CompetitorPrice.price).join(
+        Product, Product.id == CompetitorPrice.product_id
+    ).filter(
+        Product.is_active == True,
+        CompetitorPrice.in_stock == True,
+    )
+    if product_ids is not None:
+        product_query = product_query.filter(Product.id.in_(product_ids))
+        price_query = price_query.filter(CompetitorPrice.product_id.in_(product_ids))
+    
+    products = product_query.order_by(Product.id).all()
+    rows = price_query.order_by(CompetitorPrice.product_id, CompetitorPrice.id).all()
+    
+    n = len(products)
+    ids = np.fromiter((p.id for p in products), dtype=np.int64, count=n)
+    category_names, category_codes = np.unique(
+        np.array([p.category for p in products], dtype=object), return_inverse=True
+    )
+    
+    competitor_count = np.zeros(n, dtype=np.int64)
+    competitor_avg = np.full(n, np.nan)
+    competitor_min = np.full(n, np.nan)
+    competitor_max = np.full(n, np.nan)
+    
+    if rows:
+        row_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        row_prices = [r[1] for r in rows]
+        group_ids, starts, counts = np.unique(row_ids, return_index=True, return_counts=True)
+        positions = np.searchsorted(ids, group_ids)
+        
+        prices = np.array(row_prices, dtype=np.float64)
+        competitor_count[positions] = counts
+        competitor_min[positions] = np.minimum.reduceat(prices, starts)
+        competitor_max[positions] = np.maximum.reduceat(prices, starts)
+        # Sum in row order with Python floats so averages are bit-identical
+        # to calculate_price()
+        competitor_avg[positions] = [
+            sum(row_prices[start:start + count]) / count
+            for start, count in zip(starts.tolist(), counts.tolist())
+        ]
+    
+    return PricingInputs(
+        product_ids=ids,
+        costs=np.fromiter((p.cost for p in products), dtype=np.float64, count=n),
+        our_prices=np.fromiter((p.our_price for p in products), dtype=np.float64, count=n),
+        competitor_count=competitor_count,
+        competitor_avg=competitor_avg,
+        competitor_min=competitor_min,
+        competitor_max=competitor_max,
+        stored_stats=np.array(
+            [(p.min_price, p.max_price, p.avg_competitor_price) for p in products],
+            dtype=np.float64,
+        ).reshape(n, 3),
+        category_codes=category_codes,
+        category_names=category_names.tolist(),
+    )
+
+
+def calculate_prices_batch(
+    inputs: PricingInputs,
+    strategy: PricingStrategy,
+    popularity: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Apply calculate_price() rules to the whole catalog with array operations.
+    
+    `popularity` (0..1 per product, see feature_store.popularity_scores())
+    moves competitor-based prices up for best sellers and down for slow
+    movers by up to popularity_weight * POPULARITY_MAX_ADJUSTMENT, before
+    the margin and markup limits are applied.
+    """
+    costs = inputs.costs
+    avg = inputs.competitor_avg
+    
+    # Base price with minimum markup
+    base_price = costs * (1 + strategy.min_markup / 100)
+    min_price = costs + strategy.min_margin_rub
+    max_price = costs * (1 + strategy.max_markup / 100)
+    
+    with np.errstate(invalid='ignore'):
+        final_price = np.select(
+            [
+                avg > base_price * 1.15,  # Competitors much more expensive: undercut by 5%
+                avg < base_price * 0.85,  # Competitors much cheaper: slight premium
+            ],
+            [
+                avg * 0.95,
+                avg * 1.02,
+            ],
+            default=np.maximum(base_price, avg * 0.98),
+        )
+    
+    if popularity is not None:
+        final_price = final_price * (1 + strategy.popularity_weight * POPULARITY_MAX_ADJUSTMENT * (2 * popularity - 1))
+    
+    # Ensure minimum margin, then maximum markup
+    final_price = np.minimum(np.maximum(final_price, min_price), max_price)
+    
+    # Without competitor prices: base price, minimum margin only
+    return np.where(inputs.has_competitors, final_price, np.maximum(base_price, min_price))
+
+
+def update_catalog_prices(
+    db: Session,
+    strategy: Optional[PricingStrategy] = None,
+    product_ids: Optional[List[int]] = None,
+) -> Dict[str, int]:
+    """Reprice active products (all by default) and write back only what changed (caller commits)."""
+    if not strategy:
+        strategy = get_active_strategy(db)
+    
+    if not strategy:
+        raise ValueError("No active pricing strategy found")
+    
+    inputs = load_pricing_inputs(db, product_ids)
+    new_prices = calculate_prices_batch(inputs, strategy, popularity_scores(inputs.product_ids))
+    
+    changed = price_change_mask(inputs.our_prices, new_prices)
+    
+    # Competitor stats are kept on the product as in calculate_price(); write them only when they moved
+    stats = np.column_stack([inputs.competitor_min, inputs.competitor_max, inputs.competitor_avg])
+    stats_changed = inputs.has_competitors & (stats != inputs.stored_stats).any(axis=1)
+    
+    stats_rows = [
+        {
+            'id': int(inputs.product_ids[i]),
+            'min_price': float(stats[i, 0]),
+            'max_price': float(stats[i, 1]),
+            'avg_competitor_price': float(stats[i, 2]),
+        }
+        for i in np.flatnonzero(stats_changed)
+    ]
+    if stats_rows:
+        db.execute(update(Product), stats_rows)
+    
+    write_price_changes(db, [
+        PriceChange(
+            product_id=int(inputs.product_ids[i]),
+            old_price=float(inputs.our_prices[i]),
+            new_price=float(new_prices[i]),
+            reason="auto_pricing",
+        )
+        for i in np.flatnonzero(changed)
+    ])
+    
+    updated_count = int(changed.sum())
+    logger.info(f"Repriced {len(inputs)} products, {updated_count} prices changed")
+    
+    return {"total_products": len(inputs), "updated_count": updated_count}
@@ -0,0 +1,357 @@
+"""Columnar, memory-mapped store of per-product pricing features."""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from redis.exceptions import LockError
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import redis_client
+from app.models import Product, CompetitorPrice, SalesStats
+from app.price_monitor.change_tracker import (
+    FEATURE_DIRTY_PRODUCTS_KEY, mark_products_dirty, pop_dirty_products, dirty_products_count
+)
+
+logger = logging.getLogger(__name__)
+
+# Column name -> dtype, one .npy file each, all sorted by product_id
+FEATURE_COLUMNS = {
+    "product_id": np.int64,
+    "cost": np.float64,
+    "competitor_count": np.int64,
+    "competitor_min": np.float64,
+    "competitor_avg": np.float64,
+    "competitor_max": np.float64,
+    "sales_count_week": np.int64,
+    "sales_count_month": np.int64,
+    "avg_rating": np.float64,
+}
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+# Prefix of the directory a build writes its version into before publishing it
+STAGING_PREFIX = ".staging-"
+
+# Held for the whole build, one builder at a time across workers
+BUILD_LOCK_KEY = "features:build_lock"
+
+# Older versions kept on disk for readers that still have them mapped
+KEEP_VERSIONS = 2
+
+# Incremental rebuilds fall back to a full one when this share of the store changed
+FULL_REBUILD_RATIO = 0.5
+
+
+class FeatureStoreBusy(RuntimeError):
+    """Another build holds the build lock."""
+
+
+@dataclass
+class FeatureSnapshot:
+    """One published version of the store, columns memory-mapped read-only."""
+    version: int
+    built_at: datetime
+    columns: Dict[str, np.ndarray]
+    
+    def __len__(self) -> int:
+        return len(self.columns["product_id"])
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+    
+    def lookup(self, product_ids: np.ndarray, name: str, fill: float = np.nan) -> np.ndarray:
+        """Values of one column for `product_ids`, `fill` where a product is missing."""
+        result = np.full(len(product_ids), fill, dtype=np.float64)
+        store_ids = self.columns["product_id"]
+        if not len(store_ids):
+            return result
+        
+        positions = np.minimum(np.searchsorted(store_ids, product_ids), len(store_ids) - 1)
+        found = store_ids[positions] == product_ids
+        result[found] = self.columns[name][positions[found]]
+        return result
+    
+    def popularity(self, product_ids: np.ndarray) -> np.ndarray:
+        """Percentile of weekly sales across the catalog, 0..1 with 0.5 for unknown products."""
+        sales = np.sort(self.columns["sales_count_week"])
+        if len(sales) < 2:
+            return np.full(len(product_ids), 0.5)
+        
+        weekly = self.lookup(product_ids, "sales_count_week")
+        known = ~np.isnan(weekly)
+        
+        # Average rank of ties, scaled to 0..1
+        lower = np.searchsorted(sales, weekly[known], side="left")
+        upper = np.searchsorted(sales, weekly[known], side="right")
+        
+        scores = np.full(len(product_ids), 0.5)
+        scores[known] = (lower + upper - 1) / 2 / (len(sales) - 1)
+        return scores
+
+
+class FeatureStore:
+    """Pricing features as one .npy file per column in versioned directories.
+    
+    Builders write a complete new version into a staging directory of their
+    own, then switch the CURRENT pointer with an atomic rename, so readers
+    in other processes only ever map a finished version. A Redis lock keeps
+    builds from overlapping. Incremental builds re-read just the products
+    marked dirty since the previous build and merge them into the last version.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.feature_store_path
+    
+    def current_version(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def load(self) -> Optional[FeatureSnapshot]:
+        """Map the current version, or None when nothing has been built yet."""
+        version = self.current_version()
+        if version is None:
+            return None
+        
+        version_path = self._version_path(version)
+        with open(os.path.join(version_path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        
+        return FeatureSnapshot(
+            version=version,
+            built_at=datetime.fromisoformat(manifest["built_at"]),
+            columns={
+                name: np.load(os.path.join(version_path, f"{name}.npy"), mmap_mode="r")
+                for name in FEATURE_COLUMNS
+            },
+        )
+    
+    def build(self, db: Session, full: bool = False) -> Dict:
+        """Publish a new version, incrementally unless `full` or there is none yet.
+        
+        An incremental build raises FeatureStoreBusy right away when another
+        build is running, its products stay queued for the next one. A full
+        build waits for the running one first.
+        """
+        timeout = settings.feature_store_build_lock_seconds
+        lock = redis_client.lock(BUILD_LOCK_KEY, timeout=timeout)
+        if not lock.acquire(blocking=full, blocking_timeout=timeout):
+            raise FeatureStoreBusy("Another feature store build is running")
+        
+        try:
+            return self._build(db, full)
+        
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                logger.warning(f"Feature store build lock expired after {timeout}s, before the build finished")
+    
+    def _build(self, db: Session, full: bool) -> Dict:
+        previous = self.load()
+        
+        pending = dirty_products_count(FEATURE_DIRTY_PRODUCTS_KEY)
+        full = full or previous is None or pending > len(previous) * FULL_REBUILD_RATIO
+        
+        # Take the queued products now, a full build covers them anyway
+        product_ids = pop_dirty_products(pending, FEATURE_DIRTY_PRODUCTS_KEY)
+        if not full and not product_ids:
+            return {"version": previous.version, "rows": len(previous), "changed": 0, "full": False}
+        
+        try:
+            if full:
+                columns = self._read_columns(db)
+                changed_count = len(columns["product_id"])
+            else:
+                columns = self._merge(previous, self._read_columns(db, product_ids), product_ids)
+                changed_count = len(product_ids)
+            
+            version = self._publish(columns)
+        
+        except Exception:
+            # Keep the products queued for the next build
+            mark_products_dirty(product_ids, FEATURE_DIRTY_PRODUCTS_KEY)
+            raise
+        
+        logger.info(
+            f"Feature store version {version}: {len(columns['product_id'])} products, "
+            f"{changed_count} re-read{' (full build)' if full else ''}"
+        )
+        
+        return {
+            "version": version,
+            "rows": len(columns["product_id"]),
+            "changed": changed_count,
+            "full": full,
+        }
+    
+    def _read_columns(self, db: Session, product_ids: Optional[List[int]] = None) -> Dict[str, np.ndarray]:
+        """Read features of active products from the database, sorted by product_id."""
+        competitor_stats = db.query(
+            CompetitorPrice.product_id.label("product_id"),
+            func.count(CompetitorPrice.id).label("competitor_count"),
+            func.min(CompetitorPrice.price).label("competitor_min"),
+            func.avg(CompetitorPrice.price).label("competitor_avg"),
+            func.max(CompetitorPrice.price).label("competitor_max"),
+        ).filter(
+            CompetitorPrice.in_stock == True
+        ).group_by(CompetitorPrice.product_id)
+        if product_ids is not None:
+            competitor_stats = competitor_stats.filter(CompetitorPrice.product_id.in_(product_ids))
+        competitor_stats = competitor_stats.subquery()
+        
+        query = db.query(
+            Product.id,
+            Product.cost,
+            competitor_stats.c.competitor_count,
+            competitor_stats.c.competitor_min,
+            competitor_stats.c.competitor_avg,
+            competitor_stats.c.competitor_max,
+            SalesStats.sales_count_week,
+            SalesStats.sales_count_month,
+            SalesStats.avg_rating,
+        ).outerjoin(
+            competitor_stats, competitor_stats.c.product_id == Product.id
+        ).outerjoin(
+            SalesStats, SalesStats.product_id == Product.id
+        ).filter(
+            Product.is_active == True
+        )
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+        
+        rows = query.order_by(Product.id).all()
+        
+        # NULL counts become 0, NULL prices and ratings NaN
+        columns = {}
+        for index, (name, dtype) in enumerate(FEATURE_COLUMNS.items()):
+            if dtype is np.int64:
+                columns[name] = np.fromiter((row[index] or 0 for row in rows), dtype=dtype, count=len(rows))
+            else:
+                columns[name] = np.array([row[index] for row in rows], dtype=dtype).reshape(len(rows))
+        return columns
+    
+    def _merge(
+        self,
+        previous: FeatureSnapshot,
+        changed: Dict[str, np.ndarray],
+        product_ids: List[int],
+    ) -> Dict[str, np.ndarray]:
+        """Replace `product_ids` in the previous version with freshly read rows."""
+        # Products that went inactive are re-read as missing and so drop out here
+        keep = ~np.isin(previous["product_id"], np.array(product_ids, dtype=np.int64))
+        merged = {
+            name: np.concatenate([previous[name][keep], changed[name]])
+            for name in FEATURE_COLUMNS
+        }
+        
+        order = np.argsort(merged["product_id"], kind="stable")
+        return {name: values[order] for name, values in merged.items()}
+    
+    def _publish(self, columns: Dict[str, np.ndarray]) -> int:
+        """Write the next version directory and point CURRENT at it."""
+        os.makedirs(self.path, exist_ok=True)
+        version = self._next_version()
+        
+        staging_path = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=self.path)
+        try:
+            # mkdtemp creates it private, readers may run as another user
+            os.chmod(staging_path, 0o755)
+            
+            for name, dtype in FEATURE_COLUMNS.items():
+                np.save(os.path.join(staging_path, f"{name}.npy"), np.ascontiguousarray(columns[name], dtype=dtype))
+            
+            with open(os.path.join(staging_path, MANIFEST_FILE), "w") as f:
+                json.dump({
+                    "version": version,
+                    "built_at": datetime.utcnow().isoformat(),
+                    "rows": len(columns["product_id"]),
+                    "columns": list(FEATURE_COLUMNS),
+                }, f)
+            
+            # Fails instead of replacing if the version directory already has files
+            os.rename(staging_path, self._version_path(version))
+        
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+        
+        fd, current_tmp = tempfile.mkstemp(prefix=f"{CURRENT_FILE}.", dir=self.path)
+        with os.fdopen(fd, "w") as f:
+            f.write(str(version))
+        os.chmod(current_tmp, 0o644)
+        os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+        
+        self._remove_old_versions(version)
+        return version
+    
+    def _next_version(self) -> int:
+        """One past the highest version on disk, published or not."""
+        versions = [
+            int(entry[1:]) for entry in os.listdir(self.path)
+            if entry.startswith("v") and entry[1:].isdigit()
+        ]
+        return max(versions + [self.current_version() or 0]) + 1
+    
+    def _remove_old_versions(self, version: int) -> None:
+        # Staging directories older than the build lock belong to builds that died
+        stale_before = time.time() - settings.feature_store_build_lock_seconds
+        
+        for entry in os.listdir(self.path):
+            entry_path = os.path.join(self.path, entry)
+            if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) <= version - KEEP_VERSIONS:
+                shutil.rmtree(entry_path, ignore_errors=True)
+            elif entry.startswith(STAGING_PREFIX) and os.path.getmtime(entry_path) < stale_before:
+                shutil.rmtree(entry_path, ignore_errors=True)
+    
+    def _version_path(self, version: int) -> str:
+        return os.path.join(self.path, f"v{version}")
+
+
+_snapshot_lock = threading.Lock()
+_snapshot: Optional[FeatureSnapshot] = None
+
+
+def get_feature_snapshot() -> Optional[FeatureSnapshot]:
+    """Current feature store version for this process, re-mapped when a newer one is published."""
+    global _snapshot
+    
+    store = FeatureStore()
+    version = store.current_version()
+    
+    with _snapshot_lock:
+        if version is None:
+            return None
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = store.load()
+        return _snapshot
+
+
+def popularity_scores(product_ids: np.ndarray) -> Optional[np.ndarray]:
+    """Weekly sales percentiles for popularity pricing, None when it is off or no store is built."""
+    if not settings.popularity_pricing_enabled:
+        return None
+    
+    try:
+        snapshot = get_feature_snapshot()
+    except Exception as e:
+        logger.error(f"Error loading feature store: {str(e)}")
+        return None
+    
+    if snapshot is None:
+        logger.warning("Popularity pricing is enabled but the feature store has not been built")
+        return None
+    
+    return snapshot.popularity(product_ids)
@@ -0,0 +1,56 @@
+"""Debounced single-product repricing on cost and competitor price changes."""
+import logging
+from typing import Iterable
+from app.config import settings
+from app.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+REPRICE_PENDING_KEY = "pricing:reprice_pending:{product_id}"
+
+# A pending marker outlives a lost task by at most this long
+PENDING_TTL_SECONDS = 300
+
+
+def request_reprice(product_ids: Iterable[int]) -> int:
+    """Queue a delayed reprice task per product unless one is already pending.
+    
+    Changes arriving while a task waits out `reprice_debounce_seconds` are
+    picked up by that task, so a burst of writes costs a single reprice.
+    """
+    if not settings.event_repricing_enabled:
+        return 0
+    
+    ids = sorted({int(product_id) for product_id in product_ids})
+    if not ids:
+        return 0
+    
+    # Imported here: the tasks package registers the listeners that call this module
+    from app.tasks.update_prices import reprice_product
+    
+    try:
+        pipe = redis_client.pipeline()
+        for product_id in ids:
+            pipe.set(
+                REPRICE_PENDING_KEY.format(product_id=product_id), 1,
+                nx=True, ex=settings.reprice_debounce_seconds + PENDING_TTL_SECONDS,
+            )
+        acquired = pipe.execute()
+        
+        queued = 0
+        for product_id, is_new in zip(ids, acquired):
+            if is_new:
+                reprice_product.apply_async(args=(product_id,), countdown=settings.reprice_debounce_seconds)
+                queued += 1
+        
+        logger.debug(f"Queued repricing for {queued} of {len(ids)} changed products")
+        return queued
+    
+    except Exception as e:
+        logger.error(f"Error queueing repricing for {len(ids)} products: {str(e)}")
+        return 0
+
+
+def clear_reprice_pending(product_id: int) -> None:
+    """Let new changes queue another reprice; called as the task starts."""
+    redis_client.delete(REPRICE_PENDING_KEY.format(product_id=product_id))
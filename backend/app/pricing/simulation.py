@@ -0,0 +1,184 @@
+"""What-if pricing over an in-memory catalog snapshot."""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import PricingStrategy
+from app.pricing.batch import PricingInputs, load_pricing_inputs, calculate_prices_batch
+from app.pricing.feature_store import popularity_scores
+from app.pricing.writeback import price_change_mask
+
+logger = logging.getLogger(__name__)
+
+# Bucket edges for the distribution of price changes, in percent
+CHANGE_BUCKETS = [-20.0, -10.0, -5.0, -1.0, 1.0, 5.0, 10.0, 20.0]
+CHANGE_PERCENTILES = [5, 25, 50, 75, 95]
+
+# Strategy fields the pricing rules do not read, so a simulation cannot show their effect
+UNSIMULATED_FIELDS = ("competitor_weight", "undercut_percentage")
+
+_snapshot_lock = threading.Lock()
+_snapshot: Optional[PricingInputs] = None
+_snapshot_loaded_at = 0.0
+
+
+def get_catalog_snapshot(db: Session, refresh: bool = False) -> PricingInputs:
+    """Pricing inputs for the whole catalog, reloaded after `pricing_snapshot_ttl_seconds`.
+    
+    The lock only guards the swap. Through AsyncSession.run_sync the load
+    yields to the event loop, so holding the lock across it would block
+    the loop thread in a concurrent call. Concurrent misses each load.
+    """
+    global _snapshot, _snapshot_loaded_at
+    
+    with _snapshot_lock:
+        expired = time.monotonic() - _snapshot_loaded_at > settings.pricing_snapshot_ttl_seconds
+        if not (refresh or _snapshot is None or expired):
+            return _snapshot
+    
+    started_at = time.monotonic()
+    snapshot = load_pricing_inputs(db)
+    logger.info(f"Loaded pricing snapshot of {len(snapshot)} products")
+    
+    with _snapshot_lock:
+        # A load started later than ours has already replaced it with fresher data
+        if started_at >= _snapshot_loaded_at:
+            _snapshot = snapshot
+            _snapshot_loaded_at = started_at
+    
+    return snapshot
+
+
+def strategy_with_overrides(strategy: Optional[PricingStrategy], overrides: Dict) -> PricingStrategy:
+    """Detached strategy with some parameters replaced."""
+    values = {}
+    if strategy is not None:
+        values = {
+            attr.key: getattr(strategy, attr.key)
+            for attr in inspect(PricingStrategy).column_attrs
+        }
+    values.update(overrides)
+    
+    # Fill anything still unset with the column defaults
+    for column in PricingStrategy.__table__.columns:
+        if values.get(column.key) is None and column.default is not None and column.default.is_scalar:
+            values[column.key] = column.default.arg
+    
+    return PricingStrategy(**values)
+
+
+def simulate_strategy(inputs: PricingInputs, strategy: PricingStrategy) -> Dict:
+    """Price the snapshot with `strategy` and summarize the effect, without writing."""
+    current = inputs.our_prices
+    simulated = calculate_prices_batch(inputs, strategy, popularity_scores(inputs.product_ids))
+    
+    # Same rule update_catalog_prices() uses to decide what to write
+    changed = price_change_mask(current, simulated)
+    new_prices = np.where(changed, simulated, current)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_percent = (new_prices - current) / current * 100
+    finite = np.isfinite(change_percent)
+    
+    return {
+        "strategy": {
+            "min_markup": strategy.min_markup,
+            "max_markup": strategy.max_markup,
+            "min_margin_rub": strategy.min_margin_rub,
+            "popularity_weight": strategy.popularity_weight,
+        },
+        "total_products": len(inputs),
+        "changed_count": int(changed.sum()),
+        "increased_count": int((new_prices > current).sum()),
+        "decreased_count": int((new_prices < current).sum()),
+        "price_change": _change_distribution(change_percent[finite & changed]),
+        "margin": _margin_impact(inputs.costs, current, new_prices),
+        "categories": _category_summary(inputs, current, new_prices, changed),
+    }
+
+
+def _change_distribution(change_percent: np.ndarray) -> Dict:
+    """Histogram and percentiles of price changes in percent."""
+    edges = [-np.inf] + CHANGE_BUCKETS + [np.inf]
+    counts, _ = np.histogram(change_percent, bins=edges)
+    
+    buckets = []
+    for low, high, count in zip(edges[:-1], edges[1:], counts.tolist()):
+        buckets.append({
+            "from_percent": None if np.isinf(low) else low,
+            "to_percent": None if np.isinf(high) else high,
+            "count": count,
+        })
+    
+    if not len(change_percent):
+        return {"buckets": buckets, "mean_percent": None, "percentiles": {}}
+    
+    percentiles = np.percentile(change_percent, CHANGE_PERCENTILES)
+    return {
+        "buckets": buckets,
+        "mean_percent": round(float(change_percent.mean()), 2),
+        "percentiles": {
+            f"p{p}": round(float(value), 2)
+            for p, value in zip(CHANGE_PERCENTILES, percentiles.tolist())
+        },
+    }
+
+
+def _margin_impact(costs: np.ndarray, current: np.ndarray, simulated: np.ndarray) -> Dict:
+    """Catalog margin before and after, one unit per SKU."""
+    current_margin = float((current - costs).sum())
+    simulated_margin = float((simulated - costs).sum())
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current_percent = (current - costs) / current * 100
+        simulated_percent = (simulated - costs) / simulated * 100
+    
+    return {
+        "current_margin_rub": round(current_margin, 2),
+        "simulated_margin_rub": round(simulated_margin, 2),
+        "margin_change_rub": round(simulated_margin - current_margin, 2),
+        "current_avg_margin_percent": _finite_mean(current_percent),
+        "simulated_avg_margin_percent": _finite_mean(simulated_percent),
+        "below_cost_count": int((simulated < costs).sum()),
+    }
+
+
+def _category_summary(
+    inputs: PricingInputs,
+    current: np.ndarray,
+    simulated: np.ndarray,
+    changed: np.ndarray,
+) -> List[Dict]:
+    """Changed SKUs and margin change per category."""
+    codes = inputs.category_codes
+    size = len(inputs.category_names)
+    
+    totals = np.bincount(codes, minlength=size)
+    changed_counts = np.bincount(codes, weights=changed, minlength=size)
+    increased = np.bincount(codes, weights=simulated > current, minlength=size)
+    decreased = np.bincount(codes, weights=simulated < current, minlength=size)
+    margin_change = np.bincount(codes, weights=simulated - current, minlength=size)
+    
+    return [
+        {
+            "category": name,
+            "total_products": int(totals[i]),
+            "changed_count": int(changed_counts[i]),
+            "increased_count": int(increased[i]),
+            "decreased_count": int(decreased[i]),
+            "margin_change_rub": round(float(margin_change[i]), 2),
+        }
+        for i, name in enumerate(inputs.category_names)
+    ]
+
+
+def _finite_mean(values: np.ndarray) -> Optional[float]:
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    return round(float(values.mean()), 2)
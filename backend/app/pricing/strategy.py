@@ -1,6 +1,8 @@
 """Pricing strategy implementation."""
 from app.models import Product, CompetitorPrice, PricingStrategy
 from app.database import SessionLocal
+from app.price_monitor.context import MarketContext
+from app.pricing.strategy_cache import get_active_strategy
 from sqlalchemy.orm import Session
 import logging
 from typing import Optional
@@ -12,13 +14,19 @@ def calculate_price(
     product: Product,
     db: Session,
     strategy: Optional[PricingStrategy] = None,
+    context: Optional[MarketContext] = None,
 ) -> Optional[float]:
-    """Calculate optimal price for product."""
+    """Calculate optimal price for product.
+    
+    A preloaded `context` supplies the strategy and competitor prices
+    instead of querying them.
+    """
+    
+    if not strategy and context is not None:
+        strategy = context.strategy
     
     if not strategy:
-        strategy = db.query(PricingStrategy).filter(
-            PricingStrategy.is_active == True
-        ).first()
+        strategy = get_active_strategy(db)
     
     if not strategy:
         logger.error("No active pricing strategy found")
@@ -28,10 +36,13 @@ def calculate_price(
     base_price = product.cost * (1 + strategy.min_markup / 100)
     
     # Get competitor prices
-    competitor_prices = db.query(CompetitorPrice).filter(
-        CompetitorPrice.product_id == product.id,
-        CompetitorPrice.in_stock == True,
-    ).all()
+    if context is not None:
+        competitor_prices = context.in_stock_prices
+    else:
+        competitor_prices = db.query(CompetitorPrice).filter(
+            CompetitorPrice.product_id == product.id,
+            CompetitorPrice.in_stock == True,
+        ).all()
     
     if not competitor_prices:
         logger.debug(f"No competitor prices for {product.sku}, using base price")
@@ -0,0 +1,126 @@
+"""Process-local cache of the active pricing strategy."""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import redis_client
+from app.models import PricingStrategy
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_CHANNEL = "pricing:strategy_changed"
+
+# Pause before resubscribing after the Redis connection drops
+LISTENER_RETRY_SECONDS = 5.0
+
+
+class StrategyCache:
+    """Active PricingStrategy cached per process.
+    
+    The strategy is re-read after `strategy_cache_ttl_seconds`, or as soon as
+    a message arrives on STRATEGY_CHANNEL. The cached object is a detached
+    copy, so it can be shared between sessions and threads. Each process
+    (including forked Celery workers) starts its own listener on first use.
+    """
+    
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.strategy_cache_ttl_seconds if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._strategy: Optional[PricingStrategy] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._listener_pid: Optional[int] = None
+    
+    def get(self, db: Session) -> Optional[PricingStrategy]:
+        """Return the active strategy, reading it from the database when stale."""
+        self._ensure_listener()
+        
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._strategy
+            generation = self._generation
+        
+        strategy = self._load(db)
+        
+        with self._lock:
+            # An invalidation that raced with the load wins, the next call reloads
+            if generation == self._generation:
+                self._strategy = strategy
+                self._expires_at = time.monotonic() + self.ttl
+        
+        return strategy
+    
+    def invalidate(self) -> None:
+        """Drop the cached strategy in this process."""
+        with self._lock:
+            self._strategy = None
+            self._expires_at = 0.0
+            self._generation += 1
+    
+    def _load(self, db: Session) -> Optional[PricingStrategy]:
+        strategy = db.query(PricingStrategy).filter(
+            PricingStrategy.is_active == True
+        ).first()
+        
+        if not strategy:
+            return None
+        
+        return PricingStrategy(**{
+            attr.key: getattr(strategy, attr.key)
+            for attr in inspect(PricingStrategy).column_attrs
+        })
+    
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            # Threads do not survive fork, and neither should the parent's cache
+            self._listener_pid = pid
+            self._strategy = None
+            self._expires_at = 0.0
+            self._generation += 1
+        
+        threading.Thread(target=self._listen, name="strategy-cache-listener", daemon=True).start()
+    
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(STRATEGY_CHANNEL)
+                # Anything cached before the subscription took effect may have missed a message
+                self.invalidate()
+                
+                for message in pubsub.listen():
+                    self.invalidate()
+            
+            except Exception as e:
+                logger.error(f"Strategy cache listener error: {str(e)}")
+                self.invalidate()
+                time.sleep(LISTENER_RETRY_SECONDS)
+
+
+strategy_cache = StrategyCache()
+
+
+def get_active_strategy(db: Session) -> Optional[PricingStrategy]:
+    """Active pricing strategy from the process-local cache."""
+    return strategy_cache.get(db)
+
+
+def publish_strategy_changed() -> None:
+    """Invalidate the cached strategy here and in every other process."""
+    strategy_cache.invalidate()
+    
+    try:
+        redis_client.publish(STRATEGY_CHANNEL, "changed")
+    except Exception as e:
+        logger.error(f"Error publishing strategy change: {str(e)}")
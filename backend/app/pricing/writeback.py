@@ -0,0 +1,106 @@
+"""Bulk write-back of our prices with price history."""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import Float, Integer, column, insert, update, values
+from sqlalchemy.orm import Session
+
+from app.models import Product, PriceHistory
+from app.config import settings
+from app.price_monitor.change_tracker import mark_dirty_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Rows per UPDATE ... FROM (VALUES ...), keeps bind parameters under PostgreSQL's limit
+VALUES_CHUNK_SIZE = 5000
+
+
+@dataclass
+class PriceChange:
+    """One change of our selling price."""
+    product_id: int
+    old_price: float
+    new_price: float
+    reason: Optional[str] = None
+
+
+def price_change_mask(old_prices: np.ndarray, new_prices: np.ndarray, epsilon: Optional[float] = None) -> np.ndarray:
+    """Which new prices are worth writing: non-zero and more than `epsilon` away."""
+    if epsilon is None:
+        epsilon = settings.price_change_epsilon
+    return (np.abs(new_prices - old_prices) > epsilon) & (new_prices != 0)
+
+
+def write_price_changes(
+    db: Session,
+    changes: Iterable[PriceChange],
+    epsilon: Optional[float] = None,
+) -> int:
+    """Apply price changes and append PriceHistory rows (caller commits).
+    
+    No-op changes within `epsilon` are dropped. On PostgreSQL prices are set
+    with a single UPDATE ... FROM (VALUES ...) per chunk, elsewhere with an
+    executemany UPDATE. Products are marked dirty once the session commits.
+    """
+    if epsilon is None:
+        epsilon = settings.price_change_epsilon
+    
+    # Last change per product wins
+    by_product: Dict[int, PriceChange] = {}
+    for change in changes:
+        if change.new_price and abs(change.new_price - change.old_price) > epsilon:
+            by_product[change.product_id] = change
+    
+    if not by_product:
+        return 0
+    
+    pending = list(by_product.values())
+    
+    if db.get_bind().dialect.name == "postgresql":
+        for offset in range(0, len(pending), VALUES_CHUNK_SIZE):
+            _update_from_values(db, pending[offset:offset + VALUES_CHUNK_SIZE])
+    else:
+        db.execute(
+            update(Product),
+            [{'id': change.product_id, 'our_price': change.new_price} for change in pending],
+        )
+    
+    now = datetime.utcnow()
+    db.execute(
+        insert(PriceHistory),
+        [
+            {
+                'product_id': change.product_id,
+                'old_price': change.old_price,
+                'new_price': change.new_price,
+                'change_reason': change.reason,
+                'created_at': now,
+            }
+            for change in pending
+        ],
+    )
+    
+    # Bulk UPDATE bypasses the session listeners, so report repriced products explicitly
+    mark_dirty_on_commit(db, by_product.keys())
+    
+    logger.debug(f"Wrote {len(pending)} price changes")
+    return len(pending)
+
+
+def _update_from_values(db: Session, changes: List[PriceChange]) -> None:
+    """UPDATE products SET our_price = v.new_price FROM (VALUES ...) AS v."""
+    changed = values(
+        column('id', Integer),
+        column('new_price', Float),
+        name='price_changes',
+    ).data([(change.product_id, change.new_price) for change in changes])
+    
+    db.execute(
+        update(Product).where(
+            Product.id == changed.c.id
+        ).values(
+            our_price=changed.c.new_price
+        ).execution_options(synchronize_session=False)
+    )
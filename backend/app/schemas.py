@@ -102,3 +102,8 @@ class PricingStrategyUpdate(BaseModel):
     popularity_weight: Optional[float] = None
     min_margin_rub: Optional[float] = None
     undercut_percentage: Optional[float] = None
+
+
+# Price comparison schemas
+class PriceCompareBatch(BaseModel):
+    product_ids: List[int] = Field(..., min_length=1, max_length=500)
@@ -1,6 +1,7 @@
 """Celery tasks package."""
 from celery import Celery
 from app.config import settings
+from app.price_monitor import change_tracker  # noqa: F401  (registers dirty-product listeners)
 
 celery_app = Celery(
     "building_price_engine",
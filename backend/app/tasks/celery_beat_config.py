@@ -4,17 +4,24 @@ from app.config import settings
 
 # Celery Beat schedule
 CELERY_BEAT_SCHEDULE = {
-    # Monitor all prices every 30 minutes
+    # Monitor products with changed inputs every 30 minutes
+    'monitor-changed-prices': {
+        'task': 'app.tasks.monitor_prices.monitor_changed_prices',
+        'schedule': settings.price_check_interval * 60.0,  # Convert minutes to seconds
+        'options': {'queue': 'monitoring'}
+    },
+    
+    # Full sweep over all products as a safety net
     'monitor-all-prices': {
         'task': 'app.tasks.monitor_prices.monitor_all_prices',
-        'schedule': settings.price_check_interval * 60.0,  # Convert minutes to seconds
+        'schedule': settings.price_full_sweep_interval * 60.0,
         'options': {'queue': 'monitoring'}
     },
     
-    # Monitor price sources every hour
-    'monitor-sources-round': {
-        'task': 'app.tasks.monitor_prices.monitor_sources_round',
-        'schedule': 3600.0,  # Every hour
+    # Dispatch price sources whose check_interval_minutes has elapsed
+    'dispatch-due-sources': {
+        'task': 'app.tasks.monitor_prices.dispatch_due_sources',
+        'schedule': settings.source_scheduler_interval_seconds,
         'options': {'queue': 'monitoring'}
     },
     
@@ -33,6 +40,21 @@ CELERY_BEAT_SCHEDULE = {
         'options': {'queue': 'pricing'}
     },
     
+    # Merge changed products into the pricing feature store
+    'rebuild-feature-store': {
+        'task': 'app.tasks.maintenance.rebuild_feature_store',
+        'schedule': settings.feature_store_refresh_interval * 60.0,
+        'options': {'queue': 'maintenance'}
+    },
+    
+    # Full feature store rebuild daily at 2 AM
+    'rebuild-feature-store-full': {
+        'task': 'app.tasks.maintenance.rebuild_feature_store',
+        'schedule': crontab(hour=2, minute=0),
+        'kwargs': {'full': True},
+        'options': {'queue': 'maintenance'}
+    },
+    
     # Cleanup old alerts daily at 3 AM
     'cleanup-old-alerts': {
         'task': 'app.tasks.maintenance.cleanup_old_alerts',
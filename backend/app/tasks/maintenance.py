@@ -2,6 +2,8 @@
 from celery import shared_task
 from app.database import SessionLocal
 from app.models_extended import PriceAlert, PriceSnapshot
+from app.price_monitor.rollup import SnapshotRollup
+from app.pricing.feature_store import FeatureStore, FeatureStoreBusy
 from datetime import datetime, timedelta
 import logging
 
@@ -56,3 +58,49 @@ def cleanup_old_snapshots():
     
     finally:
         db.close()
+
+
+@shared_task
+def rebuild_snapshot_rollup(product_ids: list = None):
+    """Rebuild the hourly snapshot rollup from raw price snapshots."""
+    db = SessionLocal()
+    
+    try:
+        logger.info("Rebuilding hourly price snapshot rollup")
+        
+        rows = SnapshotRollup(db).rebuild(product_ids)
+        
+        db.commit()
+        logger.info(f"Rebuilt {rows} hourly rollup rows")
+        
+        return {"status": "success", "rows": rows}
+    
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding snapshot rollup: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def rebuild_feature_store(full: bool = False):
+    """Publish a new feature store version from products changed since the last one."""
+    db = SessionLocal()
+    
+    try:
+        result = FeatureStore().build(db, full=full)
+        
+        return {"status": "success", **result}
+    
+    except FeatureStoreBusy as e:
+        logger.info(f"Feature store rebuild skipped: {str(e)}")
+        return {"status": "skipped", "message": str(e)}
+    
+    except Exception as e:
+        logger.error(f"Error rebuilding feature store: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        db.close()
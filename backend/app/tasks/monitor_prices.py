@@ -1,20 +1,37 @@
 """Celery tasks for continuous price monitoring."""
-from celery import shared_task
+from celery import shared_task, chain, chord
 from app.database import SessionLocal
 from app.price_monitor.monitor import PriceMonitor
+from app.price_monitor.source_lock import running_source_checks
+from app.models import Product
 from app.models_extended import PriceSource
+from app.config import settings
 import logging
-from datetime import datetime
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+MONITORING_QUEUE = "monitoring"
+
+# Dispatched checks that have not started yet; running ones hold their check lock
+QUEUED_STATUS = "queued"
+DEFAULT_CHECK_INTERVAL_MINUTES = 60
+
 
 @shared_task
-def monitor_all_prices():
+def monitor_all_prices(sharded: Optional[bool] = None):
     """Monitor prices from all sources."""
+    if sharded is None:
+        sharded = settings.monitor_sharding_enabled
+    
     db = SessionLocal()
     
     try:
+        if sharded:
+            return _dispatch_monitor_shards(db)
+        
         logger.info("Starting comprehensive price monitoring")
         
         monitor = PriceMonitor(db)
@@ -31,6 +48,110 @@ def monitor_all_prices():
         db.close()
 
 
+@shared_task
+def monitor_products_shard(carried_stats: Optional[Dict[str, int]], product_ids: List[int]):
+    """Monitor one shard of products and add its stats to the ones carried along its lane."""
+    db = SessionLocal()
+    
+    try:
+        logger.info(f"Monitoring shard of {len(product_ids)} products")
+        
+        monitor = PriceMonitor(db)
+        stats = monitor.monitor_products(product_ids)
+        
+        return _merge_stats([carried_stats, stats])
+    
+    except Exception as e:
+        # Keep the lane going; the remaining shards still get processed
+        logger.error(f"Error monitoring shard of {len(product_ids)} products: {str(e)}")
+        return _merge_stats([carried_stats])
+    
+    finally:
+        db.close()
+
+
+@shared_task
+def merge_monitor_stats(lane_stats: List[Dict[str, int]]):
+    """Chord callback: merge per-lane stats into the monitor_all_prices result."""
+    stats = _merge_stats(lane_stats)
+    
+    logger.info(f"Sharded price monitoring completed: {stats}")
+    return {"status": "success", "stats": stats}
+
+
+def _dispatch_monitor_shards(db) -> Dict:
+    """Split active products into shards and fan them out as a chord.
+    
+    Shards are dealt round-robin into at most `monitor_max_parallel_shards`
+    lanes. Each lane is a chain, so no more than that many shards run at once.
+    """
+    product_ids = [
+        product_id for (product_id,) in db.query(Product.id).filter(
+            Product.is_active == True
+        ).order_by(Product.id).all()
+    ]
+    
+    shard_size = settings.monitor_shard_size
+    shards = [product_ids[i:i + shard_size] for i in range(0, len(product_ids), shard_size)]
+    
+    if not shards:
+        return {"status": "success", "stats": _merge_stats([])}
+    
+    lane_count = min(settings.monitor_max_parallel_shards, len(shards))
+    lanes = [shards[lane::lane_count] for lane in range(lane_count)]
+    
+    header = [
+        chain(
+            monitor_products_shard.s(None, lane[0]).set(queue=MONITORING_QUEUE),
+            *[monitor_products_shard.s(shard).set(queue=MONITORING_QUEUE) for shard in lane[1:]]
+        )
+        for lane in lanes
+    ]
+    result = chord(header)(merge_monitor_stats.s().set(queue=MONITORING_QUEUE))
+    
+    logger.info(
+        f"Dispatched {len(shards)} monitoring shards for {len(product_ids)} products "
+        f"in {lane_count} lanes"
+    )
+    return {
+        "status": "dispatched",
+        "chord_id": result.id,
+        "shards": len(shards),
+        "lanes": lane_count,
+    }
+
+
+def _merge_stats(stats_list: List[Optional[Dict[str, int]]]) -> Dict[str, int]:
+    """Sum monitoring stats dicts."""
+    merged = PriceMonitor._empty_stats()
+    for stats in stats_list:
+        for key, value in (stats or {}).items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+@shared_task
+def monitor_changed_prices():
+    """Monitor prices only for products whose inputs changed since the last run."""
+    db = SessionLocal()
+    
+    try:
+        logger.info("Starting incremental price monitoring")
+        
+        monitor = PriceMonitor(db)
+        stats = monitor.monitor_changed_products()
+        
+        logger.info(f"Incremental price monitoring completed: {stats}")
+        return {"status": "success", "stats": stats}
+    
+    except Exception as e:
+        logger.error(f"Error in incremental price monitoring: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        db.close()
+
+
 @shared_task
 def monitor_price_source(source_id: int):
     """Monitor specific price source."""
@@ -81,3 +202,77 @@ def monitor_sources_round():
     
     finally:
         db.close()
+
+
+@shared_task
+def dispatch_due_sources():
+    """Dispatch monitor_price_source for every source whose check interval has elapsed.
+    
+    Sources are ordered by next due time (last_checked + check_interval_minutes)
+    in a priority queue; the most overdue ones are dispatched first, as parallel
+    tasks, up to `source_monitor_max_concurrency` checks in flight.
+    """
+    db = SessionLocal()
+    
+    try:
+        now = datetime.utcnow()
+        stale_before = now - timedelta(minutes=settings.source_check_stale_minutes)
+        
+        sources = db.query(PriceSource).filter(
+            PriceSource.is_active == True
+        ).all()
+        running = running_source_checks(source.id for source in sources)
+        
+        # Running checks count against the cap while they hold their lock,
+        # queued ones until they have waited longer than the stale window
+        in_flight = 0
+        due_queue = []
+        for source in sources:
+            queued = (
+                source.check_status == QUEUED_STATUS
+                and source.updated_at and source.updated_at > stale_before
+            )
+            if source.id in running or queued:
+                in_flight += 1
+                continue
+            
+            if source.last_checked:
+                interval = timedelta(minutes=source.check_interval_minutes or DEFAULT_CHECK_INTERVAL_MINUTES)
+                next_due = source.last_checked + interval
+            else:
+                next_due = datetime.min
+            
+            heapq.heappush(due_queue, (next_due, source.id, source))
+        
+        slots = max(settings.source_monitor_max_concurrency - in_flight, 0)
+        dispatched = []
+        while due_queue and len(dispatched) < slots and due_queue[0][0] <= now:
+            _, source_id, source = heapq.heappop(due_queue)
+            source.check_status = QUEUED_STATUS
+            dispatched.append(source)
+        
+        # Commit the queued status before dispatching so the next tick skips these sources
+        db.commit()
+        
+        for source in dispatched:
+            monitor_price_source.apply_async(args=(source.id,), queue=MONITORING_QUEUE)
+        
+        if dispatched:
+            logger.info(
+                f"Dispatched {len(dispatched)} due price sources "
+                f"({in_flight} already in flight): {[s.name for s in dispatched]}"
+            )
+        
+        return {
+            "status": "success",
+            "dispatched": [source.id for source in dispatched],
+            "in_flight": in_flight,
+        }
+    
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error dispatching due price sources: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        db.close()
@@ -1,9 +1,8 @@
 """Celery tasks for updating prices."""
 from celery import shared_task
-from celery.beat import schedule
 from app.database import SessionLocal
-from app.models import Product
-from app.pricing.strategy import calculate_price
+from app.pricing.batch import update_catalog_prices
+from app.pricing.reprice_queue import clear_reprice_pending
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,27 +16,41 @@ def update_all_prices():
     try:
         logger.info("Starting price update")
         
-        products = db.query(Product).filter(Product.is_active == True).all()
-        updated_count = 0
-        
-        for product in products:
-            try:
-                new_price = calculate_price(product, db)
-                if new_price and new_price != product.our_price:
-                    product.our_price = new_price
-                    updated_count += 1
-            except Exception as e:
-                logger.error(f"Error updating price for {product.sku}: {str(e)}")
-                continue
+        result = update_catalog_prices(db)
         
         db.commit()
-        logger.info(f"Price update completed. Updated {updated_count} products")
+        logger.info(f"Price update completed. Updated {result['updated_count']} products")
         
-        return {"status": "success", "updated_count": updated_count}
+        return {"status": "success", "updated_count": result['updated_count']}
     
     except Exception as e:
+        db.rollback()
         logger.error(f"Price update error: {str(e)}")
         return {"status": "error", "message": str(e)}
     
     finally:
         db.close()
+
+
+@shared_task
+def reprice_product(product_id: int):
+    """Reprice one product after its cost or competitor prices changed."""
+    # Changes committed from here on queue a fresh task
+    clear_reprice_pending(product_id)
+    
+    db = SessionLocal()
+    
+    try:
+        result = update_catalog_prices(db, product_ids=[product_id])
+        
+        db.commit()
+        
+        return {"status": "success", "product_id": product_id, "updated_count": result['updated_count']}
+    
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error repricing product {product_id}: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""Read-through Redis cache for API responses."""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Iterable, List
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import LockError
+from app.config import settings
+from app.database import redis_client, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "cache:"
+LOCK_SUFFIX = ":lock"
+
+# A loader holding the lock longer than this is assumed dead
+LOCK_TIMEOUT_SECONDS = 10
+WAIT_INTERVAL_SECONDS = 0.05
+
+# Keys deleted per DEL command
+INVALIDATE_CHUNK_SIZE = 1000
+
+
+def price_compare_key(product_id: int) -> str:
+    return f"{CACHE_PREFIX}prices:compare:{product_id}"
+
+
+def market_analysis_key(product_id: int) -> str:
+    return f"{CACHE_PREFIX}monitoring:market-analysis:{product_id}"
+
+
+def price_ranking_key(product_id: int) -> str:
+    return f"{CACHE_PREFIX}monitoring:price-ranking:{product_id}"
+
+
+PRODUCT_KEYS = (price_compare_key, market_analysis_key, price_ranking_key)
+
+
+async def cached(key: str, ttl: int, loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached value of `key`, or load, cache and return it.
+    
+    Only one caller per key runs `loader` at a time. The others wait up to
+    `cache_lock_wait_seconds` for its result before loading it themselves,
+    so an expired hot key costs one query rather than a burst. If Redis is
+    unavailable the loader is called directly.
+    """
+    try:
+        value = await async_redis_client.get(key)
+        if value is not None:
+            return json.loads(value)
+        
+        lock = async_redis_client.lock(key + LOCK_SUFFIX, timeout=LOCK_TIMEOUT_SECONDS)
+        acquired = await lock.acquire(blocking=False)
+    
+    except Exception as e:
+        logger.error(f"Cache read error for {key}: {str(e)}")
+        return jsonable_encoder(await loader())
+    
+    if not acquired:
+        value = await _wait_for_value(key)
+        if value is not None:
+            return value
+        return jsonable_encoder(await loader())
+    
+    try:
+        result = jsonable_encoder(await loader())
+        await _store(key, result, ttl)
+        return result
+    
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            # Expired while loading, someone else may hold it now
+            pass
+        except Exception as e:
+            logger.error(f"Cache lock release error for {key}: {str(e)}")
+
+
+async def _store(key: str, value: Any, ttl: int) -> None:
+    try:
+        await async_redis_client.set(key, json.dumps(value), ex=ttl)
+    except Exception as e:
+        logger.error(f"Cache write error for {key}: {str(e)}")
+
+
+async def _wait_for_value(key: str) -> Any:
+    """Poll for a value another caller is loading, None if it does not arrive in time."""
+    waited = 0.0
+    while waited < settings.cache_lock_wait_seconds:
+        await asyncio.sleep(WAIT_INTERVAL_SECONDS)
+        waited += WAIT_INTERVAL_SECONDS
+        
+        try:
+            value = await async_redis_client.get(key)
+        except Exception as e:
+            logger.error(f"Cache read error for {key}: {str(e)}")
+            return None
+        
+        if value is not None:
+            return json.loads(value)
+    
+    return None
+
+
+def _product_keys(product_ids: Iterable[int]) -> List[str]:
+    return [key(int(product_id)) for product_id in set(product_ids) for key in PRODUCT_KEYS]
+
+
+def invalidate_products(product_ids: Iterable[int]) -> None:
+    """Drop cached responses for products (sync, for tasks and session listeners)."""
+    keys = _product_keys(product_ids)
+    
+    try:
+        for offset in range(0, len(keys), INVALIDATE_CHUNK_SIZE):
+            redis_client.delete(*keys[offset:offset + INVALIDATE_CHUNK_SIZE])
+    except Exception as e:
+        logger.error(f"Error invalidating cache for {len(keys)} keys: {str(e)}")
+
+
+async def invalidate_products_async(product_ids: Iterable[int]) -> None:
+    """Drop cached responses for products (API routes)."""
+    keys = _product_keys(product_ids)
+    
+    try:
+        for offset in range(0, len(keys), INVALIDATE_CHUNK_SIZE):
+            await async_redis_client.delete(*keys[offset:offset + INVALIDATE_CHUNK_SIZE])
+    except Exception as e:
+        logger.error(f"Error invalidating cache for {len(keys)} keys: {str(e)}")
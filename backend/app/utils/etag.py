@@ -0,0 +1,33 @@
+"""Weak ETags for conditional GET."""
+from datetime import datetime
+from typing import Optional
+from fastapi import Request, Response
+
+
+def weak_etag(*parts) -> str:
+    """W/"..." built from ids, counts and timestamps."""
+    values = []
+    for part in parts:
+        if isinstance(part, datetime):
+            part = int(part.timestamp() * 1_000_000)
+        values.append("0" if part is None else str(part))
+    tag = "-".join(values)
+    return f'W/"{tag}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names `etag`, compared weakly."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    
+    if header.strip() == "*":
+        return True
+    
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    """Empty 304 response carrying the ETag."""
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
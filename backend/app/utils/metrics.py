@@ -0,0 +1,46 @@
+"""Prometheus metrics."""
+from typing import Dict
+from prometheus_client import Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class PoolCollector:
+    """Report size and usage of registered engine pools at scrape time."""
+    
+    def __init__(self):
+        self.engines: Dict[str, object] = {}
+    
+    def register(self, name: str, engine) -> None:
+        # Engines replace their pool on dispose(), so read engine.pool on every scrape
+        self.engines[name] = engine
+    
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["pool"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently in use", labels=["pool"])
+        checked_in = GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=["pool"])
+        
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "size"):
+                continue
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            checked_in.add_metric([name], pool.checkedin())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+        
+        yield size
+        yield checked_out
+        yield checked_in
+        yield overflow
+
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
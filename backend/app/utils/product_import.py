@@ -0,0 +1,328 @@
+"""Bulk import of products from streamed CSV or NDJSON."""
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+from pydantic import ValidationError
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, Text, literal, select, true
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import schemas
+from app.models import Product
+from app.price_monitor.change_tracker import mark_dirty_on_commit
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = list(schemas.ProductCreate.model_fields)
+
+# Rows validated and staged at a time
+IMPORT_CHUNK_SIZE = 5000
+
+# Rows per INSERT on backends without COPY, keeps bind parameters under SQLite's limit
+GENERIC_CHUNK_SIZE = 500
+
+# Rejected rows listed in the report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# A quoted CSV record spanning more than this is taken as an unbalanced quote
+MAX_CSV_RECORD_LINES = 100
+MAX_CSV_RECORD_BYTES = 1024 * 1024
+
+# Longest line read from an upload
+MAX_LINE_BYTES = 1024 * 1024
+
+CSV_CONTENT_TYPES = ("text/csv",)
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Row number of the record in the upload, then its fields or why it could not be read
+ImportRow = Tuple[int, Union[Dict, str]]
+
+
+class ImportFormatError(ValueError):
+    """The upload cannot be read at all."""
+
+# Session-local table the upload is copied into, dropped on commit
+staging_table = Table(
+    "product_import_staging",
+    MetaData(),
+    Column("row_number", Integer),
+    Column("sku", String(100)),
+    Column("name", String(500)),
+    Column("description", Text),
+    Column("category", String(200)),
+    Column("subcategory", String(200)),
+    Column("cost", Float),
+    Column("our_price", Float),
+    Column("main_image_url", String(500)),
+    Column("images_json", Text),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+# Product columns an import overwrites when the SKU exists
+UPDATE_COLUMNS = [name for name in IMPORT_COLUMNS if name != "sku"]
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into lines without holding more than one in memory.
+    
+    A line longer than MAX_LINE_BYTES fails the upload with ImportFormatError.
+    """
+    # Pieces of the line still being received, joined once it is complete
+    pending: List[bytes] = []
+    pending_size = 0
+    
+    async for chunk in chunks:
+        *lines, tail = chunk.split(b"\n")
+        for line in lines:
+            if pending_size + len(line) > MAX_LINE_BYTES:
+                raise ImportFormatError(f"Line longer than {MAX_LINE_BYTES} bytes")
+            
+            pending.append(line)
+            yield b"".join(pending).decode("utf-8-sig")
+            pending, pending_size = [], 0
+        
+        pending.append(tail)
+        pending_size += len(tail)
+        if pending_size > MAX_LINE_BYTES:
+            raise ImportFormatError(f"Line longer than {MAX_LINE_BYTES} bytes")
+    
+    if pending_size:
+        yield b"".join(pending).decode("utf-8-sig")
+
+
+async def read_csv(lines: AsyncIterator[str]) -> AsyncIterator[ImportRow]:
+    """Records of a CSV upload with a header row, quoted line breaks included.
+    
+    A record whose quotes are still open after MAX_CSV_RECORD_LINES lines or
+    MAX_CSV_RECORD_BYTES is reported as unreadable, and reading resumes on
+    the next line. So is one still open at the end of the upload.
+    """
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    pending_size = 0
+    quotes = 0
+    row_number = 0
+    
+    async for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        quotes += line.count('"')
+        
+        # A record is complete once its quotes are balanced
+        if quotes % 2:
+            if len(pending) < MAX_CSV_RECORD_LINES and pending_size < MAX_CSV_RECORD_BYTES:
+                continue
+            
+            if header is None:
+                raise ImportFormatError("CSV header has an unterminated quoted field")
+            
+            pending, pending_size, quotes = [], 0, 0
+            row_number += 1
+            yield row_number, "Unterminated quoted field"
+            continue
+        
+        record = "\n".join(pending)
+        pending, pending_size, quotes = [], 0, 0
+        if not record.strip():
+            continue
+        
+        values = next(csv.reader([record.rstrip("\r")]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        
+        row_number += 1
+        # Empty cells are missing values, not empty strings
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+    
+    # Quotes still open at the end of the upload
+    if pending:
+        if header is None:
+            raise ImportFormatError("CSV header has an unterminated quoted field")
+        
+        row_number += 1
+        yield row_number, "Unterminated quoted field"
+
+
+async def read_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[ImportRow]:
+    """Objects of an NDJSON upload, an error message for lines that are not a JSON object."""
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        
+        row_number += 1
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            fields = None
+        yield row_number, fields if isinstance(fields, dict) else "Not a JSON object"
+
+
+class ProductImporter:
+    """Upsert products by SKU from a stream of rows.
+    
+    Rows are validated with ProductCreate in chunks. On PostgreSQL each
+    chunk is COPYed into a temporary staging table and a single
+    INSERT ... SELECT ... ON CONFLICT (sku) DO UPDATE merges the upload at
+    the end, later rows winning over earlier ones with the same SKU. Other
+    backends upsert chunk by chunk. Either way the import is one
+    transaction and memory is bounded by the chunk size.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.received = 0
+        self.error_count = 0
+        self.errors: List[Dict] = []
+        self.created = 0
+        self.updated = 0
+    
+    async def run(self, rows: AsyncIterator[ImportRow]) -> Dict:
+        connection = await self.db.connection()
+        is_postgresql = connection.dialect.name == "postgresql"
+        
+        if is_postgresql:
+            await connection.run_sync(staging_table.create)
+        
+        chunk: List[Dict] = []
+        async for row_number, fields in rows:
+            self.received += 1
+            product = self._validate(row_number, fields)
+            if product is not None:
+                chunk.append(product)
+            
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await (self._copy_to_staging(chunk) if is_postgresql else self._upsert_generic(chunk))
+                chunk = []
+        
+        if chunk:
+            await (self._copy_to_staging(chunk) if is_postgresql else self._upsert_generic(chunk))
+        
+        if is_postgresql:
+            await self._merge_staging()
+        
+        await self.db.commit()
+        
+        logger.info(
+            f"Product import: {self.received} rows, {self.created} created, "
+            f"{self.updated} updated, {self.error_count} rejected"
+        )
+        
+        return {
+            "received": self.received,
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+    
+    def _validate(self, row_number: int, fields: Union[Dict, str]) -> Optional[Dict]:
+        if isinstance(fields, str):
+            self._reject(row_number, None, [{"field": None, "message": fields}])
+            return None
+        
+        try:
+            product = schemas.ProductCreate.model_validate(fields)
+        except ValidationError as e:
+            self._reject(row_number, fields.get("sku"), [
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                for error in e.errors()
+            ])
+            return None
+        
+        return {"row_number": row_number, **product.model_dump()}
+    
+    def _reject(self, row_number: int, sku: Optional[str], errors: List[Dict]) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "sku": sku, "errors": errors})
+    
+    async def _copy_to_staging(self, chunk: List[Dict]) -> None:
+        """COPY a chunk into the staging table through the asyncpg connection."""
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        
+        columns = [column.name for column in staging_table.columns]
+        await raw_connection.driver_connection.copy_records_to_table(
+            staging_table.name,
+            records=[tuple(row[name] for name in columns) for row in chunk],
+            columns=columns,
+        )
+    
+    async def _merge_staging(self) -> None:
+        """Upsert the whole staging table into products in one statement."""
+        now = datetime.utcnow()
+        staged = select(
+            *[staging_table.c[name] for name in IMPORT_COLUMNS],
+            true(),
+            literal(now),
+            literal(now),
+            literal(now),
+        ).distinct(
+            staging_table.c.sku
+        ).order_by(
+            staging_table.c.sku, staging_table.c.row_number.desc()
+        )
+        
+        stmt = pg_insert(Product).from_select(
+            IMPORT_COLUMNS + ["is_active", "created_at", "updated_at", "last_synced"],
+            staged,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sku"],
+            set_={
+                **{name: stmt.excluded[name] for name in UPDATE_COLUMNS},
+                "updated_at": now,
+                "last_synced": now,
+            },
+        ).returning(Product.id, Product.created_at)
+        
+        product_ids: Set[int] = set()
+        for product_id, created_at in (await self.db.execute(stmt)).all():
+            product_ids.add(product_id)
+            if created_at == now:
+                self.created += 1
+            else:
+                self.updated += 1
+        
+        mark_dirty_on_commit(self.db.sync_session, product_ids, features=True)
+    
+    async def _upsert_generic(self, chunk: List[Dict]) -> None:
+        """INSERT ... ON CONFLICT (sku) DO UPDATE in small chunks, for SQLite."""
+        now = datetime.utcnow()
+        
+        # Last row wins within the chunk, as it does across chunks
+        by_sku = {row["sku"]: row for row in chunk}
+        
+        for offset in range(0, len(by_sku), GENERIC_CHUNK_SIZE):
+            rows = [
+                {name: row[name] for name in IMPORT_COLUMNS}
+                for row in list(by_sku.values())[offset:offset + GENERIC_CHUNK_SIZE]
+            ]
+            
+            stmt = sqlite_insert(Product).values([
+                {**row, "is_active": True, "created_at": now, "updated_at": now, "last_synced": now}
+                for row in rows
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["sku"],
+                set_={
+                    **{name: stmt.excluded[name] for name in UPDATE_COLUMNS},
+                    "updated_at": now,
+                    "last_synced": now,
+                },
+            ).returning(Product.id, Product.created_at)
+            
+            returned = (await self.db.execute(stmt)).all()
+            created = sum(1 for product_id, created_at in returned if created_at == now)
+            self.created += created
+            self.updated += len(returned) - created
+            
+            mark_dirty_on_commit(self.db.sync_session, [product_id for product_id, _ in returned], features=True)
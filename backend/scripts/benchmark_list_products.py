@@ -0,0 +1,101 @@
+"""Compare GET /api/products/ latency with and without API_FAST_LIST_RESPONSES.
+
+Runs the app in-process against the configured DATABASE_URL, which should
+hold at least --limit products, and calls the endpoint directly over ASGI
+so only the application's own time is measured.
+
+    cd backend && python -m scripts.benchmark_list_products --limit 1000 --requests 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Tuple
+
+from app.config import settings
+from app.database import async_engine
+from app.main import create_app
+
+
+async def call(app, path: str, query: str) -> Tuple[int, int]:
+    """Send one GET through the ASGI interface, return status and body size."""
+    status = 0
+    size = 0
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+    
+    await app({
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }, receive, send)
+    return status, size
+
+
+async def measure(app, limit: int, requests: int, warmup: int) -> Tuple[List[float], int]:
+    query = f"limit={limit}"
+    for _ in range(warmup):
+        await call(app, "/api/products/", query)
+    
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        status, size = await call(app, "/api/products/", query)
+        timings.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            raise SystemExit(f"GET /api/products/ returned {status}")
+    return timings, size
+
+
+def report(name: str, timings: List[float], size: int) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{name:<10} median {statistics.median(timings):8.2f} ms   "
+        f"p95 {p95:8.2f} ms   mean {statistics.mean(timings):8.2f} ms   body {size} bytes"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=1000, help="page size")
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per mode")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per mode")
+    args = parser.parse_args()
+    
+    app = create_app()
+    results = {}
+    
+    for name, fast in (("standard", False), ("fast", True)):
+        settings.api_fast_list_responses = fast
+        results[name] = await measure(app, args.limit, args.requests, args.warmup)
+    
+    print(f"GET /api/products/?limit={args.limit}, {args.requests} requests per mode")
+    for name, (timings, size) in results.items():
+        report(name, timings, size)
+    
+    speedup = statistics.median(results["standard"][0]) / statistics.median(results["fast"][0])
+    print(f"fast mode median speedup: {speedup:.2f}x")
+    
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""Shared fixtures: a SQLite database, a stand-in for Redis and an API client."""
+import asyncio
+import random
+from unittest.mock import MagicMock
+import fakeredis
+import fakeredis.aioredis
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api import products
+from app.database import SessionLocal, get_async_db
+from app.main import create_app
+from app.models import Base, Product, Competitor, CompetitorPrice, PricingStrategy
+import app.models_extended  # noqa: F401  (registers the monitoring tables)
+from app.pricing import feature_store, reprice_queue, strategy_cache
+from app.price_monitor import change_tracker, source_lock
+from app.tasks import update_prices
+from app.utils import cache
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    """An empty in-memory Redis per test; no strategy listener, no Celery broker."""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    for module in (change_tracker, source_lock, feature_store, reprice_queue, strategy_cache, cache):
+        monkeypatch.setattr(module, "redis_client", client)
+    monkeypatch.setattr(cache, "async_redis_client", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    
+    monkeypatch.setattr(strategy_cache.StrategyCache, "_ensure_listener", lambda self: None)
+    monkeypatch.setattr(update_prices.reprice_product, "apply_async", MagicMock())
+    strategy_cache.strategy_cache.invalidate()
+    return client
+
+
+@pytest.fixture
+def event_loop(redis):
+    """Loop of async tests, closed once the executor is done with what commits handed it.
+    
+    Commits on a thread running a loop publish dirty products from the
+    executor; this finishes before the Redis stand-in is removed.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(loop.shutdown_default_executor())
+    loop.close()
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    """A file database, so the sync and async engines see the same data."""
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def engine(database_path):
+    engine = create_engine(f"sqlite:///{database_path}", connect_args={"check_same_thread": False})
+    
+    # Index names are per schema, but two history tables both declare idx_product_date
+    seen = set()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in seen:
+                index.name = f"{index.name}_{table.name}"
+            seen.add(index.name)
+    
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """Session from the application's SessionLocal, so its listeners run."""
+    original_bind = SessionLocal.kw.get("bind")
+    SessionLocal.configure(bind=engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    SessionLocal.configure(bind=original_bind)
+
+
+@pytest.fixture
+def make_catalog(db):
+    """Add `count` products with up to `max_competitors` competitor prices each."""
+    def make(count: int, seed: int = 1, max_competitors: int = 5, min_competitors: int = 0):
+        rng = random.Random(seed)
+        
+        competitors = [
+            Competitor(name=f"competitor-{seed}-{i}", competitor_type=f"type-{i}", base_url="https://example.com")
+            for i in range(max_competitors)
+        ]
+        db.add_all(competitors)
+        db.flush()
+        
+        for i in range(count):
+            cost = round(rng.uniform(10, 1000), 2)
+            product = Product(
+                sku=f"sku-{seed}-{i}",
+                name=f"Product {i}",
+                category=f"category-{i % 3}",
+                cost=cost,
+                our_price=round(cost * rng.uniform(1.05, 1.4), 2),
+            )
+            db.add(product)
+            db.flush()
+            
+            for competitor in competitors[:rng.randint(min_competitors, max_competitors)]:
+                db.add(CompetitorPrice(
+                    product_id=product.id,
+                    competitor_id=competitor.id,
+                    price=round(cost * rng.uniform(0.7, 1.6), 2),
+                    in_stock=rng.random() > 0.2,
+                ))
+        
+        if not db.query(PricingStrategy).count():
+            db.add(PricingStrategy())
+        db.commit()
+    
+    return make
+
+
+@pytest.fixture
+async def async_session_factory(engine, database_path, monkeypatch):
+    """AsyncSessionLocal's equivalent on the test database."""
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+    factory = async_sessionmaker(
+        async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+        sync_session_class=SessionLocal.class_,
+    )
+    monkeypatch.setattr(products, "AsyncSessionLocal", factory)
+    
+    yield factory
+    
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def client(async_session_factory):
+    """HTTP client calling the app in-process on the test database."""
+    application = create_app()
+    
+    async def get_test_db():
+        async with async_session_factory() as session:
+            yield session
+    
+    application.dependency_overrides[get_async_db] = get_test_db
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://test") as client:
+        yield client
@@ -0,0 +1,33 @@
+"""Vectorized repricing against the scalar calculate_price()."""
+import pytest
+
+from app.config import settings
+from app.models import Product
+from app.pricing.batch import update_catalog_prices
+from app.pricing.strategy import calculate_price
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_catalog_prices_matches_calculate_price(db, make_catalog, seed):
+    make_catalog(400, seed=seed)
+    
+    expected = {}
+    for product in db.query(Product).filter(Product.is_active == True).all():
+        price = calculate_price(product, db)
+        expected[product.id] = (price, product.min_price, product.max_price, product.avg_competitor_price)
+    
+    # calculate_price() writes competitor stats on the product, start the batch from the stored state
+    db.rollback()
+    
+    update_catalog_prices(db)
+    db.commit()
+    db.expire_all()
+    
+    for product in db.query(Product).all():
+        price, min_price, max_price, avg_price = expected[product.id]
+        
+        # Changes within price_change_epsilon are not written
+        assert product.our_price == price or abs(product.our_price - price) <= settings.price_change_epsilon, product.sku
+        assert (product.min_price, product.max_price, product.avg_competitor_price) == (min_price, max_price, avg_price), product.sku
+    
+    assert update_catalog_prices(db)["updated_count"] == 0
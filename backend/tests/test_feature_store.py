@@ -0,0 +1,73 @@
+"""Feature store builds: the build lock and version publishing."""
+import os
+import time
+import pytest
+
+from app.models import Product
+from app.pricing.feature_store import (
+    BUILD_LOCK_KEY, CURRENT_FILE, STAGING_PREFIX, FeatureStore, FeatureStoreBusy
+)
+from app.price_monitor.change_tracker import (
+    FEATURE_DIRTY_PRODUCTS_KEY, dirty_products_count, mark_products_dirty
+)
+
+
+def test_incremental_build_is_skipped_while_another_build_runs(db, make_catalog, redis, tmp_path):
+    make_catalog(10)
+    store = FeatureStore(str(tmp_path))
+    assert store.build(db, full=True)["version"] == 1
+    
+    mark_products_dirty([product_id for product_id, in db.query(Product.id).limit(3)], FEATURE_DIRTY_PRODUCTS_KEY)
+    
+    lock = redis.lock(BUILD_LOCK_KEY, timeout=60)
+    assert lock.acquire(blocking=False)
+    with pytest.raises(FeatureStoreBusy):
+        store.build(db)
+    
+    # Nothing taken from the queue, nothing published
+    assert dirty_products_count(FEATURE_DIRTY_PRODUCTS_KEY) == 3
+    assert store.current_version() == 1
+    
+    lock.release()
+    result = store.build(db)
+    assert (result["version"], result["changed"], result["full"]) == (2, 3, False)
+
+
+def test_publish_leaves_directories_of_other_builds_alone(db, make_catalog, tmp_path):
+    make_catalog(10)
+    store = FeatureStore(str(tmp_path))
+    store.build(db, full=True)
+    
+    # A version another builder wrote but has not pointed CURRENT at yet
+    os.makedirs(tmp_path / "v2")
+    (tmp_path / "v2" / "manifest.json").write_text("{}")
+    
+    # A staging directory left by a build that died long ago
+    stale = tmp_path / f"{STAGING_PREFIX}dead"
+    os.makedirs(stale)
+    os.utime(stale, (time.time() - 10 * 3600, time.time() - 10 * 3600))
+    
+    assert store.build(db, full=True)["version"] == 3
+    assert (tmp_path / CURRENT_FILE).read_text() == "3"
+    assert (tmp_path / "v2" / "manifest.json").read_text() == "{}"
+    assert not stale.exists()
+    assert len(store.load()) == 10
+
+
+def test_incremental_build_follows_product_activation(db, make_catalog, tmp_path):
+    make_catalog(10)
+    store = FeatureStore(str(tmp_path))
+    store.build(db, full=True)
+    product = db.query(Product).first()
+    
+    product.is_active = False
+    db.commit()
+    result = store.build(db)
+    assert (result["rows"], result["changed"], result["full"]) == (9, 1, False)
+    assert product.id not in store.load()["product_id"]
+    
+    product.is_active = True
+    db.commit()
+    result = store.build(db)
+    assert (result["rows"], result["changed"], result["full"]) == (10, 1, False)
+    assert product.id in store.load()["product_id"]
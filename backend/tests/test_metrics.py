@@ -0,0 +1,10 @@
+"""Prometheus scrape endpoint."""
+
+
+async def test_metrics_answer_without_redirect(client):
+    response = await client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert "db_pool_checkout_wait_seconds" in response.text
+    assert 'db_pool_size{pool="sync"}' in response.text
@@ -0,0 +1,59 @@
+"""Query count of a monitoring batch."""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app.models import Product
+from app.models_extended import PriceSource, PriceSnapshot
+from app.price_monitor.monitor import PriceMonitor
+from app.price_monitor.write_buffer import MonitorWriteBuffer
+from app.pricing.strategy_cache import strategy_cache
+
+
+def _add_snapshots(db):
+    """Two snapshots per product far enough apart to raise alerts."""
+    source = PriceSource(name="source", source_type="marketplace", base_url="https://example.com")
+    db.add(source)
+    db.flush()
+    
+    now = datetime.utcnow()
+    for product_id, cost in db.query(Product.id, Product.cost):
+        db.add(PriceSnapshot(product_id=product_id, price_source_id=source.id, price=cost, snapshot_date=now - timedelta(hours=3)))
+        db.add(PriceSnapshot(product_id=product_id, price_source_id=source.id, price=cost * 1.5, snapshot_date=now - timedelta(hours=1)))
+    db.commit()
+
+
+def _count_batch_queries(db, engine, products):
+    """Statements one batch sends, and its stats."""
+    monitor = PriceMonitor(db)
+    stats = PriceMonitor._empty_stats()
+    statements = []
+    
+    def count(*args):
+        statements.append(args[2])
+    
+    # Start each batch with the same cold strategy cache
+    strategy_cache.invalidate()
+    
+    # Buffer large enough that the flush happens on exit, outside the counted section
+    with MonitorWriteBuffer(db, batch_size=1_000_000) as buffer:
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            monitor._monitor_batch(products, stats, buffer)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+    
+    return len(statements), stats
+
+
+def test_monitor_batch_query_count_does_not_grow_with_batch_size(db, engine, make_catalog):
+    make_catalog(60, min_competitors=2)
+    _add_snapshots(db)
+    
+    products = db.query(Product.id, Product.sku).order_by(Product.id).all()
+    
+    small, small_stats = _count_batch_queries(db, engine, products[:10])
+    large, large_stats = _count_batch_queries(db, engine, products[10:60])
+    
+    assert small_stats['alerts_created'] == 10
+    assert large_stats['alerts_created'] == 50
+    assert small == large
@@ -0,0 +1,45 @@
+"""POST /api/prices/compare:batch."""
+from sqlalchemy import event
+
+from app.models import Product
+
+
+async def _count_queries(client, async_session_factory, product_ids):
+    """Statements one batch comparison sends, and the response."""
+    engine = async_session_factory.kw["bind"].sync_engine
+    statements = []
+    
+    def count(*args):
+        statements.append(args[2])
+    
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = await client.post("/api/prices/compare:batch", json={"product_ids": product_ids})
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    
+    return len(statements), response
+
+
+async def test_compare_batch_query_count_does_not_grow_with_product_count(client, db, make_catalog, async_session_factory):
+    make_catalog(60, min_competitors=2)
+    product_ids = [product_id for product_id, in db.query(Product.id).order_by(Product.id)]
+    
+    small, small_response = await _count_queries(client, async_session_factory, product_ids[:5])
+    large, large_response = await _count_queries(client, async_session_factory, product_ids[5:60])
+    
+    assert len(small_response.json()["comparisons"]) == 5
+    assert len(large_response.json()["comparisons"]) == 55
+    assert small == large == 3
+
+
+async def test_compare_batch_keeps_request_order_and_lists_missing_products(client, db, make_catalog):
+    make_catalog(3, min_competitors=1)
+    first, second, third = [product_id for product_id, in db.query(Product.id).order_by(Product.id)]
+    
+    response = await client.post("/api/prices/compare:batch", json={"product_ids": [third, 999, first, third]})
+    body = response.json()
+    
+    assert [comparison["product_id"] for comparison in body["comparisons"]] == [third, first]
+    assert body["not_found"] == [999]
+    assert all(comparison["competitor_prices"] for comparison in body["comparisons"])
@@ -0,0 +1,85 @@
+"""Competitor price history: bounds, resolutions and LTTB downsampling."""
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+from app.models import Competitor, CompetitorPrice, Product
+from app.utils.downsample import lttb_indices
+
+START = datetime(2024, 5, 1)
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[500] = 10.0
+    
+    kept = lttb_indices(x, y, 50)
+    
+    assert len(kept) == 50
+    assert (kept[0], kept[-1]) == (0, 999)
+    assert np.all(np.diff(kept) > 0)
+    assert 500 in kept
+
+
+def test_lttb_keeps_short_series_whole():
+    assert lttb_indices(np.arange(10.0), np.arange(10.0), 20).tolist() == list(range(10))
+
+
+@pytest.fixture
+def history(db, make_catalog):
+    """Two competitors with a price every 10 minutes for 24 hours."""
+    make_catalog(1, max_competitors=2)
+    product = db.query(Product).one()
+    for competitor in db.query(Competitor):
+        for i in range(144):
+            db.add(CompetitorPrice(
+                product_id=product.id,
+                competitor_id=competitor.id,
+                price=100 + i % 7,
+                created_at=START + timedelta(minutes=10 * i),
+            ))
+    db.commit()
+    return product
+
+
+def _times(points, key="created_at"):
+    return [datetime.fromisoformat(point[key]) for point in points]
+
+
+async def test_points_caps_each_competitor_series(client, history):
+    params = {"from": START.isoformat(), "to": (START + timedelta(days=1)).isoformat(), "points": 20}
+    
+    response = await client.get(f"/api/prices/{history.id}", params=params)
+    points = response.json()
+    
+    assert response.status_code == 200
+    for competitor_id in {point["competitor_id"] for point in points}:
+        series = [point for point in points if point["competitor_id"] == competitor_id]
+        times = _times(series)
+        
+        assert len(series) == 20
+        assert (max(times), min(times)) == (START + timedelta(minutes=1430), START)
+    
+    assert _times(points) == sorted(_times(points), reverse=True)
+
+
+async def test_from_is_inclusive_and_to_exclusive(client, history):
+    since, until = START + timedelta(hours=2), START + timedelta(hours=4)
+    
+    response = await client.get(f"/api/prices/{history.id}", params={"from": since.isoformat(), "to": until.isoformat()})
+    times = _times(response.json())
+    
+    # 12 prices per competitor in two hours
+    assert len(times) == 24
+    assert (min(times), max(times)) == (since, until - timedelta(minutes=10))
+
+
+async def test_hourly_resolution_aggregates_per_competitor(client, history):
+    params = {"from": START.isoformat(), "to": (START + timedelta(hours=3)).isoformat(), "resolution": "hourly"}
+    
+    points = (await client.get(f"/api/prices/{history.id}", params=params)).json()
+    
+    assert len(points) == 6
+    assert {point["sample_count"] for point in points} == {6}
+    assert _times(points, "period")[0] == START + timedelta(hours=2)
@@ -0,0 +1,43 @@
+"""Price trends from the hourly snapshot rollup."""
+from datetime import datetime, timedelta
+import pytest
+
+from app.models import Product
+from app.models_extended import PriceSource
+from app.price_monitor import aggregator
+from app.price_monitor.aggregator import PriceAggregator
+from app.price_monitor.rollup import SnapshotRollup
+
+
+@pytest.mark.parametrize("now, latest", [
+    # Early in the hour the last 60 minutes are mostly in the previous hour
+    (datetime(2024, 5, 14, 10, 5), datetime(2024, 5, 14, 9, 30)),
+    (datetime(2024, 5, 14, 10, 55), datetime(2024, 5, 14, 10, 50)),
+])
+def test_trends_compare_the_last_hour_with_the_same_hour_earlier(db, make_catalog, monkeypatch, now, latest):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+    
+    monkeypatch.setattr(aggregator, "datetime", FrozenDatetime)
+    
+    make_catalog(1)
+    product_id = db.query(Product.id).scalar()
+    source = PriceSource(name="source", source_type="marketplace", base_url="https://example.com")
+    db.add(source)
+    db.flush()
+    
+    SnapshotRollup(db).record([
+        (product_id, source.id, 110.0, latest),
+        (product_id, source.id, 100.0, latest - timedelta(days=7)),
+        (product_id, source.id, 50.0, latest - timedelta(days=7, hours=3)),
+    ])
+    db.commit()
+    
+    trends = PriceAggregator(db)._calculate_price_trends_bulk([product_id])[product_id]
+    
+    assert trends['trend_7d'] == pytest.approx(10.0)
+    assert trends['trend'] == 'up'
+    assert trends['trend_24h'] is None
+    assert trends['trend_30d'] is None
@@ -0,0 +1,24 @@
+"""POST /api/pricing/simulate."""
+import pytest
+
+
+async def test_simulation_applies_strategy_overrides(client, make_catalog):
+    make_catalog(50)
+    
+    response = await client.post("/api/pricing/simulate?refresh=true", json={"min_markup": 25, "max_markup": 60})
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_products"] == 50
+    assert (body["strategy"]["min_markup"], body["strategy"]["max_markup"]) == (25, 60)
+    assert "undercut_percentage" not in body["strategy"]
+
+
+@pytest.mark.parametrize("field", ["undercut_percentage", "competitor_weight"])
+async def test_simulation_rejects_parameters_the_rules_do_not_use(client, make_catalog, field):
+    make_catalog(5)
+    
+    response = await client.post("/api/pricing/simulate", json={field: 10})
+    
+    assert response.status_code == 422
+    assert field in response.json()["detail"]
@@ -0,0 +1,124 @@
+"""Bulk product import: CSV and NDJSON readers and the importer."""
+import json
+import pytest
+
+from app.models import Product
+from app.utils.product_import import MAX_LINE_BYTES, ImportFormatError, read_csv, read_lines
+
+
+async def _lines(text: str):
+    for line in text.split("\n"):
+        yield line
+
+
+async def _read(rows):
+    return [row async for row in rows]
+
+
+async def test_read_csv_reports_record_left_open_at_end_of_upload():
+    rows = await _read(read_csv(_lines(
+        "sku,name,category,cost,our_price\n"
+        "s1,a,c,1,2\n"
+        '"s2,b,c,1,2\n'
+        "s3,c,c,1,2"
+    )))
+    
+    assert rows == [
+        (1, {"sku": "s1", "name": "a", "category": "c", "cost": "1", "our_price": "2"}),
+        (2, "Unterminated quoted field"),
+    ]
+
+
+async def test_read_csv_rejects_header_left_open_at_end_of_upload():
+    with pytest.raises(ImportFormatError):
+        await _read(read_csv(_lines('"sku,name\ns1,a')))
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_read_lines_joins_lines_split_across_chunks():
+    lines = await _read(read_lines(_chunks(b"\xef\xbb\xbfsku,na", b"me\n\ns1,", "é\n".encode()[:1], "é\n".encode()[1:], b"s2")))
+    
+    assert lines == ["sku,name", "", "s1,é", "s2"]
+
+
+async def test_read_lines_rejects_line_over_limit():
+    chunk = b"x" * (MAX_LINE_BYTES // 4)
+    
+    with pytest.raises(ImportFormatError):
+        await _read(read_lines(_chunks(b"sku\n", *[chunk] * 5)))
+
+
+CSV_HEADER = "sku,name,category,cost,our_price\n"
+
+
+async def test_csv_import_creates_updates_and_reports_rejected_rows(client, db, make_catalog):
+    make_catalog(1)
+    existing_sku = db.query(Product.sku).scalar()
+    
+    response = await client.post("/api/products/bulk", headers={"Content-Type": "text/csv"}, content=(
+        CSV_HEADER
+        + "new-1,\"Name, with comma\",c,10,20\n"
+        + f"{existing_sku},Renamed,c,11,22\n"
+        + "new-2,No cost,c,,20\n"
+        + "new-3,\"Line\nbreak\",c,12,24\n"
+    ))
+    report = response.json()
+    
+    assert response.status_code == 200
+    assert (report["received"], report["created"], report["updated"], report["error_count"]) == (4, 2, 1, 1)
+    assert report["errors"] == [{"row": 3, "sku": "new-2", "errors": [{"field": "cost", "message": "Field required"}]}]
+    
+    db.expire_all()
+    assert db.query(Product.name).filter(Product.sku == existing_sku).scalar() == "Renamed"
+    assert db.query(Product.name).filter(Product.sku == "new-3").scalar() == "Line\nbreak"
+
+
+async def test_ndjson_import_reports_lines_that_are_not_objects(client, db):
+    lines = [
+        json.dumps({"sku": "n-1", "name": "a", "category": "c", "cost": 1, "our_price": 2}),
+        "[1, 2]",
+        "{not json",
+        json.dumps({"sku": "n-1", "name": "b", "category": "c", "cost": 1, "our_price": 3}),
+    ]
+    
+    response = await client.post(
+        "/api/products/bulk", headers={"Content-Type": "application/x-ndjson"}, content="\n".join(lines) + "\n"
+    )
+    report = response.json()
+    
+    assert (report["received"], report["created"], report["error_count"]) == (4, 1, 2)
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert {error["errors"][0]["message"] for error in report["errors"]} == {"Not a JSON object"}
+    
+    # The later row with the same SKU wins
+    assert db.query(Product.name).filter(Product.sku == "n-1").scalar() == "b"
+
+
+async def test_csv_import_reports_quote_left_open_at_end_of_upload(client, db):
+    response = await client.post("/api/products/bulk", headers={"Content-Type": "text/csv"}, content=(
+        CSV_HEADER + "s1,a,c,1,2\n" + '"s2,b,c,1,2\n' + "s3,c,c,1,2\n"
+    ))
+    report = response.json()
+    
+    assert (report["received"], report["created"], report["error_count"]) == (2, 1, 1)
+    assert report["errors"] == [{"row": 2, "sku": None, "errors": [{"field": None, "message": "Unterminated quoted field"}]}]
+    assert db.query(Product.sku).all() == [("s1",)]
+
+
+async def test_unreadable_upload_is_rejected_whole(client, db):
+    response = await client.post(
+        "/api/products/bulk", headers={"Content-Type": "text/csv"}, content=CSV_HEADER + "s1," + "x" * (MAX_LINE_BYTES + 1)
+    )
+    
+    assert response.status_code == 400
+    assert db.query(Product).count() == 0
+
+
+async def test_unknown_content_type_is_rejected(client):
+    response = await client.post("/api/products/bulk", headers={"Content-Type": "application/json"}, content="[]")
+    
+    assert response.status_code == 415
@@ -0,0 +1,31 @@
+"""API_FAST_LIST_RESPONSES: same bytes as the standard list response."""
+import pytest
+
+from app.config import settings
+from app.models import Product
+
+
+@pytest.mark.parametrize("params", [
+    {"limit": 50},
+    {"limit": 1000, "category": "Категория 1"},
+    {"limit": 5, "skip": 7, "is_active": "true"},
+])
+async def test_fast_list_response_is_byte_identical(client, db, make_catalog, monkeypatch, params):
+    make_catalog(40)
+    for i, product in enumerate(db.query(Product)):
+        product.category = f"Категория {i % 2}"
+        product.description = None if i % 3 else f"Описание «{i}»\n"
+        product.our_price = product.our_price + 1 / 3
+    db.commit()
+    
+    responses = {}
+    for fast in (False, True):
+        monkeypatch.setattr(settings, "api_fast_list_responses", fast)
+        responses[fast] = await client.get("/api/products/", params=params, headers={"Accept-Encoding": "identity"})
+    
+    standard, fast = responses[False], responses[True]
+    assert standard.status_code == fast.status_code == 200
+    assert fast.content == standard.content
+    assert fast.headers["ETag"] == standard.headers["ETag"]
+    assert fast.headers.get("X-Next-Cursor") == standard.headers.get("X-Next-Cursor")
+    assert fast.headers["Content-Type"] == standard.headers["Content-Type"]
@@ -0,0 +1,63 @@
+"""Product reads: ETags, conditional GET, cursors and compression."""
+import base64
+import pytest
+
+from app.models import Product
+
+
+async def test_product_etag_answers_304_until_the_product_changes(client, db, make_catalog):
+    make_catalog(1)
+    product_id = db.query(Product.id).scalar()
+    
+    response = await client.get(f"/api/products/{product_id}")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert etag.startswith('W/"')
+    
+    response = await client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+    assert (response.status_code, response.content, response.headers["ETag"]) == (304, b"", etag)
+    
+    await client.put(f"/api/products/{product_id}", json={"our_price": 555.0})
+    response = await client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+async def test_list_etag_answers_304_with_the_next_cursor(client, make_catalog):
+    make_catalog(30)
+    
+    response = await client.get("/api/products/", params={"limit": 10})
+    etag, cursor = response.headers["ETag"], response.headers["X-Next-Cursor"]
+    
+    # Weak comparison: the W/ prefix does not matter, any listed tag may match
+    for if_none_match in (etag, etag.removeprefix("W/"), f'"other", {etag}'):
+        response = await client.get("/api/products/", params={"limit": 10}, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert (response.headers["ETag"], response.headers["X-Next-Cursor"]) == (etag, cursor)
+    
+    response = await client.get("/api/products/", params={"limit": 10, "cursor": cursor}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [product["id"] for product in response.json()] == list(range(11, 21))
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b'{"offset": 10}').decode(),
+    base64.urlsafe_b64encode(b'{"id": "ten"}').decode(),
+])
+async def test_bad_cursor_is_rejected(client, make_catalog, cursor):
+    make_catalog(3)
+    
+    response = await client.get("/api/products/", params={"cursor": cursor})
+    
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+async def test_large_lists_are_compressed(client, make_catalog):
+    make_catalog(100)
+    
+    response = await client.get("/api/products/", headers={"Accept-Encoding": "br"})
+    
+    assert response.headers["Content-Encoding"] == "br"
+    assert len(response.json()) == 100
@@ -0,0 +1,47 @@
+"""Read-through response cache and its invalidation."""
+from sqlalchemy import update
+
+from app.models import Product
+from app.utils.cache import cached, price_compare_key
+
+
+async def test_cached_loads_once_then_serves_the_stored_value(redis):
+    calls = []
+    
+    async def load():
+        calls.append(1)
+        return {"value": len(calls)}
+    
+    assert await cached("cache:test", 60, load) == {"value": 1}
+    assert await cached("cache:test", 60, load) == {"value": 1}
+    assert len(calls) == 1
+    assert 0 < redis.ttl("cache:test") <= 60
+
+
+async def test_price_comparison_is_cached_until_the_product_is_updated(client, db, make_catalog, redis):
+    make_catalog(3)
+    product = db.query(Product).first()
+    key = price_compare_key(product.id)
+    
+    first = await client.get(f"/api/prices/compare/{product.id}")
+    assert first.status_code == 200
+    assert redis.exists(key)
+    
+    # A change the session listeners do not see is not visible while cached
+    db.execute(update(Product).where(Product.id == product.id).values(name="Renamed"))
+    db.commit()
+    assert (await client.get(f"/api/prices/compare/{product.id}")).json() == first.json()
+    
+    response = await client.put(f"/api/products/{product.id}", json={"our_price": 999.0})
+    assert response.status_code == 200
+    assert not redis.exists(key)
+    
+    body = (await client.get(f"/api/prices/compare/{product.id}")).json()
+    assert (body["product_name"], body["our_price"]) == ("Renamed", 999.0)
+
+
+async def test_missing_product_is_not_cached(client, redis):
+    response = await client.get("/api/prices/compare/12345")
+    
+    assert response.status_code == 404
+    assert not redis.exists(price_compare_key(12345))
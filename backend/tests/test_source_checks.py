@@ -0,0 +1,79 @@
+"""Price source checks: the per-source check lock and dispatching."""
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytest
+from redis.lock import Lock
+
+from app.config import settings
+from app.models import Product
+from app.models_extended import PriceSnapshot, PriceSource, ProductSourceMapping
+from app.price_monitor.monitor import PriceMonitor
+from app.price_monitor.source_lock import source_check_lock
+from app.tasks import monitor_prices
+
+
+@pytest.fixture
+def source(db, make_catalog):
+    make_catalog(5)
+    source = PriceSource(name="source", source_type="marketplace", base_url="https://example.com")
+    db.add(source)
+    db.flush()
+    
+    for product_id, cost in db.query(Product.id, Product.cost):
+        db.add(ProductSourceMapping(
+            product_id=product_id, price_source_id=source.id,
+            source_product_id=str(product_id), last_price=cost,
+        ))
+    db.commit()
+    return source
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    apply_async = MagicMock()
+    monkeypatch.setattr(monitor_prices.monitor_price_source, "apply_async", apply_async)
+    return apply_async
+
+
+def test_running_check_is_not_dispatched_again_after_the_stale_window(db, source, dispatched):
+    # Started long ago, so its status commit is older than source_check_stale_minutes
+    long_ago = datetime.utcnow() - timedelta(hours=3)
+    source.check_status = "running"
+    source.last_checked = long_ago
+    source.updated_at = long_ago
+    db.commit()
+    
+    lock = source_check_lock(source.id)
+    assert lock.acquire(blocking=False)
+    
+    result = monitor_prices.dispatch_due_sources()
+    assert (result["dispatched"], result["in_flight"]) == ([], 1)
+    dispatched.assert_not_called()
+    
+    # Once the check stops holding its lock the source is due again
+    lock.release()
+    result = monitor_prices.dispatch_due_sources()
+    assert (result["dispatched"], result["in_flight"]) == ([source.id], 0)
+
+
+def test_check_is_skipped_while_another_one_holds_the_lock(db, source):
+    lock = source_check_lock(source.id)
+    assert lock.acquire(blocking=False)
+    
+    assert PriceMonitor(db).monitor_price_source(source.id) is False
+    assert db.query(PriceSnapshot).count() == 0
+    
+    lock.release()
+    assert PriceMonitor(db).monitor_price_source(source.id) is True
+    assert db.query(PriceSnapshot).count() == 5
+
+
+def test_check_renews_its_lock_after_each_chunk(db, source, monkeypatch):
+    reacquire = MagicMock(wraps=Lock.reacquire, autospec=True)
+    monkeypatch.setattr(Lock, "reacquire", lambda lock: reacquire(lock))
+    monkeypatch.setattr(settings, "snapshot_write_chunk_size", 2)
+    
+    assert PriceMonitor(db).monitor_price_source(source.id) is True
+    
+    # Five mappings in chunks of two
+    assert reacquire.call_count == 3